@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Script to add the indexes the attendance REST API relies on
+
+- hr_attendance_open_per_emp: at most one open (not checked out) attendance
+  per employee, so check-in can just INSERT and let a concurrent duplicate
+  fail with a unique violation instead of searching first.
+- hr_attendance_employee_check_in: (employee_id, check_in DESC) for the
+  latest-attendance lookups and per-employee date range scans.
+"""
+
+import logging
+import psycopg2
+import os
+
+_logger = logging.getLogger(__name__)
+
+# Database connection parameters
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5432'),
+    'database': os.getenv('DB_NAME', 'hris_db'),
+    'user': os.getenv('DB_USER', 'odoo'),
+    'password': os.getenv('DB_PASSWORD', 'odoo'),
+}
+
+
+def add_attendance_indexes():
+    """Create the attendance indexes if they don't exist"""
+    conn = None
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            _logger.info("Adding (employee_id, check_in DESC) index...")
+            cursor.execute("""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS hr_attendance_employee_check_in
+                ON hr_attendance (employee_id, check_in DESC)
+            """)
+            _logger.info("✅ hr_attendance_employee_check_in is in place!")
+
+            # A unique index cannot be built over existing duplicates, and a
+            # failed CONCURRENTLY build would leave an invalid index behind
+            cursor.execute("""
+                SELECT employee_id, count(*) FROM hr_attendance
+                WHERE check_out IS NULL
+                GROUP BY employee_id
+                HAVING count(*) > 1
+            """)
+            duplicates = cursor.fetchall()
+            if duplicates:
+                for employee_id, count in duplicates:
+                    _logger.error("❌ Employee %s has %s open attendances", employee_id, count)
+                _logger.error("❌ Close the duplicate open attendances, then re-run this script")
+                return False
+
+            _logger.info("Adding one-open-attendance-per-employee index...")
+            cursor.execute("""
+                CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS hr_attendance_open_per_emp
+                ON hr_attendance (employee_id)
+                WHERE check_out IS NULL
+            """)
+            _logger.info("✅ hr_attendance_open_per_emp is in place!")
+
+    except Exception as e:
+        _logger.error("❌ Error: %s", e)
+        return False
+    finally:
+        if conn is not None:
+            conn.close()
+
+    return True
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    _logger.info("🔧 Adding attendance indexes to hr_attendance table...")
+    success = add_attendance_indexes()
+    if success:
+        _logger.info("🎉 Migration completed successfully!")
+    else:
+        _logger.error("💥 Migration failed!")
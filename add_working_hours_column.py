@@ -1,11 +1,23 @@
 #!/usr/bin/env python3
 """
 Script to add working_hours column to hr_attendance table if it doesn't exist
+
+working_hours is kept as a zero-padded 'HH:MM:SS' VARCHAR rather than an
+interval: hr.attendance declares it as fields.Char, and the REST API reads
+and writes that string, so a different column type would be converted back
+by the ORM on the next module update. The fixed-width format still sorts
+and compares correctly, e.g. working_hours > '08:00:00'.
 """
 
+import logging
 import psycopg2
+import psycopg2.pool
 import os
-from datetime import datetime
+import threading
+import time
+from contextlib import contextmanager
+
+_logger = logging.getLogger(__name__)
 
 # Database connection parameters
 DB_CONFIG = {
@@ -16,62 +28,150 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', 'odoo'),
 }
 
+# Rows rewritten per backfill transaction
+BATCH_SIZE = 30000
+
+# Advisory lock serializing concurrent runs of this migration
+LOCK_KEY = 'add_working_hours_column'
+
+# Seconds between attempts to take LOCK_KEY while another run holds it
+LOCK_RETRY_SECONDS = 2
+
+# Shared connection pool, created on first use so importing this module
+# does not need a reachable database
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool():
+    """Return the module-level connection pool, creating it once"""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = psycopg2.pool.ThreadedConnectionPool(1, 4, **DB_CONFIG)
+    return _POOL
+
+
+@contextmanager
+def _pooled_connection():
+    """Borrow a connection from the pool and always hand it back"""
+    pool = _get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        if not conn.closed:
+            conn.autocommit = False
+        pool.putconn(conn, close=bool(conn.closed))
+
+
 def add_working_hours_column():
     """Add working_hours column to hr_attendance table if it doesn't exist"""
     try:
-        # Connect to database
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        
-        # Check if column exists
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name='hr_attendance' AND column_name='working_hours'
-        """)
-        
-        if cursor.fetchone() is None:
-            print("Adding working_hours column to hr_attendance table...")
+        # Reuse a pooled connection; it is returned to the pool even on error
+        with _pooled_connection() as conn, conn.cursor() as cursor:
+            # Run in autocommit and send each unit of work as one
+            # multi-statement query: PostgreSQL executes it as a single
+            # implicit transaction (so SET LOCAL applies) and commits it,
+            # all in one round-trip instead of BEGIN/SET/stmt/COMMIT.
+            conn.autocommit = True
+            
+            # Only one runner migrates at a time; a concurrent run waits for
+            # the lock, then finds the column and backfill already done.
+            # Wait client-side with pg_try_advisory_lock rather than blocking
+            # in pg_advisory_lock: a backend blocked there holds a snapshot,
+            # and the holder's CREATE INDEX CONCURRENTLY below waits for every
+            # older snapshot to go away, which PostgreSQL reports as a deadlock.
+            while True:
+                cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (LOCK_KEY,))
+                if cursor.fetchone()[0]:
+                    break
+                _logger.info("Another run holds the migration lock, waiting...")
+                time.sleep(LOCK_RETRY_SECONDS)
+            
+            try:
+                # Add the column; IF NOT EXISTS folds the existence check into the DDL
+                _logger.info("Adding working_hours column to hr_attendance table...")
+                cursor.execute("""
+                    SET LOCAL lock_timeout = '5s';
+                    ALTER TABLE hr_attendance 
+                    ADD COLUMN IF NOT EXISTS working_hours VARCHAR(20) DEFAULT '00:00:00'
+                """)
+                _logger.info("✅ working_hours column is in place!")
             
-            # Add the column
-            cursor.execute("""
-                ALTER TABLE hr_attendance 
-                ADD COLUMN working_hours VARCHAR(20) DEFAULT '00:00:00'
-            """)
+                # Update existing records to calculate working_hours.
+                # The column stays a plain VARCHAR because hr.attendance declares
+                # it as fields.Char and the API writes it on check-out, so a
+                # generated column is not an option. Open attendances already
+                # carry the '00:00:00' default, only checked-out rows need a value.
+                # Rows that already hold a value are skipped, so re-runs are cheap.
+                # Work in id-ordered batches, committing each one, to keep locks
+                # and WAL per transaction bounded and let an interrupted run resume.
             
-            # Update existing records to calculate working_hours
-            cursor.execute("""
-                UPDATE hr_attendance 
-                SET working_hours = CASE 
-                    WHEN check_in IS NOT NULL AND check_out IS NOT NULL THEN
-                        LPAD(EXTRACT(HOUR FROM (check_out - check_in))::text, 2, '0') || ':' ||
-                        LPAD(EXTRACT(MINUTE FROM (check_out - check_in))::text, 2, '0') || ':' ||
-                        LPAD(EXTRACT(SECOND FROM (check_out - check_in))::int::text, 2, '0')
-                    ELSE '00:00:00'
-                END
-                WHERE working_hours IS NULL OR working_hours = '00:00:00'
-            """)
+                # A transient partial index over the pending rows keeps each batch
+                # an index range scan instead of re-scanning the whole table.
+                # CONCURRENTLY cannot share a query with other statements.
+                cursor.execute("""
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS hr_attendance_working_hours_todo
+                    ON hr_attendance (id)
+                    WHERE check_in IS NOT NULL AND check_out IS NOT NULL
+                      AND (working_hours IS NULL OR working_hours = '00:00:00')
+                """)
             
-            conn.commit()
-            print("✅ working_hours column added successfully!")
-            print(f"✅ Updated {cursor.rowcount} existing records")
+                updated = 0
+                last_id = 0
+                while True:
+                    # Each batch is its own transaction; the backfill is
+                    # re-runnable, so it does not need to wait on WAL flushes.
+                    cursor.execute("""
+                        SET LOCAL lock_timeout = '5s';
+                        SET LOCAL synchronous_commit = off;
+                        WITH todo AS (
+                            SELECT id FROM hr_attendance
+                            WHERE id > %s
+                              AND check_in IS NOT NULL AND check_out IS NOT NULL
+                              AND (working_hours IS NULL OR working_hours = '00:00:00')
+                            ORDER BY id
+                            LIMIT %s
+                            FOR UPDATE SKIP LOCKED
+                        ), done AS (
+                            UPDATE hr_attendance h
+                            -- Total hours like hr.attendance.write(), not hours mod 24
+                            SET working_hours = to_char(
+                                interval '1 second' * EXTRACT(EPOCH FROM h.check_out - h.check_in),
+                                'HH24:MI:SS'
+                            )
+                            FROM todo
+                            WHERE h.id = todo.id
+                            RETURNING h.id
+                        )
+                        SELECT count(*), max(id) FROM done
+                    """, (last_id, BATCH_SIZE))
+                    count, max_id = cursor.fetchone()
+                    if not count:
+                        break
+                    updated += count
+                    last_id = max_id
             
-        else:
-            print("ℹ️  working_hours column already exists")
+                cursor.execute("DROP INDEX CONCURRENTLY IF EXISTS hr_attendance_working_hours_todo")
             
-        cursor.close()
-        conn.close()
+                _logger.info("✅ Updated %s existing records", updated)
+            finally:
+                if not conn.closed:
+                    cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (LOCK_KEY,))
         
     except Exception as e:
-        print(f"❌ Error: {e}")
+        _logger.error("❌ Error: %s", e)
         return False
         
     return True
 
 if __name__ == "__main__":
-    print("🔧 Adding working_hours column to hr_attendance table...")
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    _logger.info("🔧 Adding working_hours column to hr_attendance table...")
     success = add_working_hours_column()
     if success:
-        print("🎉 Migration completed successfully!")
+        _logger.info("🎉 Migration completed successfully!")
     else:
-        print("💥 Migration failed!")
+        _logger.error("💥 Migration failed!")
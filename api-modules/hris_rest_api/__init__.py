@@ -1,2 +1,8 @@
 from . import controllers
 from . import models
+from . import preflight
+
+
+def uninstall_hook(env):
+    """Stop answering API preflights early in the uninstalling process"""
+    preflight.uninstall_preflight()
@@ -6,17 +6,24 @@
     'description': """
         This module provides REST API endpoints for the HRIS Flutter application.
         It includes authentication, employee management, leave management, and other HR features.
+
+        CORS preflights (OPTIONS) for /api/auth/ and /api/employees are answered
+        before Odoo's dispatcher, process-wide: see the README for the scope.
     """,    'author': 'Your Company',
     'website': 'https://www.yourcompany.com',    'depends': [
         'base',
         'hr',
     ],
+    'external_dependencies': {
+        'python': ['orjson', 'numpy'],
+    },
     'data': [
         'security/ir.model.access.csv',
         'data/api_endpoints.xml',
         'data/leave_types_demo.xml',
         'data/company_coordinates.xml',
     ],
+    'uninstall_hook': 'uninstall_hook',
     'installable': True,
     'application': True,
     'auto_install': False,
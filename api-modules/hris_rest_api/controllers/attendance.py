@@ -1,14 +1,85 @@
-﻿import json
+﻿import base64
+import binascii
 import logging
-from datetime import datetime, date, timedelta, time
-import pytz
+from datetime import datetime, date, timedelta, time, timezone
+import orjson
+from psycopg2.errors import UniqueViolation
 from odoo import http # type: ignore
+from odoo.exceptions import ValidationError # type: ignore
 from odoo.http import request # type: ignore
 import calendar
-from geopy.distance import geodesic
+import math
+import numpy as np
+from zoneinfo import ZoneInfo
+from collections import namedtuple
+from .session_manager import session_manager
 
 _logger = logging.getLogger(__name__)
 
+# Timezones and cut-off times, resolved once at import
+_JAKARTA_TZ = ZoneInfo('Asia/Jakarta')
+_UTC = timezone.utc
+_STANDARD_TIME = time(10, 30)  # Late if checked in after 10:30 AM
+_END_OF_DAY = time(17, 0)  # Absent if no check-in by 5:00 PM
+
+# CORS headers are static for this controller, build them once
+_CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Requested-With',
+    'Access-Control-Max-Age': '86400',
+}
+
+# Office (latitude, longitude) used when a company has none configured
+_DEFAULT_OFFICE_COORDINATES = (-6.969182, 107.629251)
+
+# Mean Earth radius used for distance checks, in meters
+_EARTH_RADIUS_M = 6371000.0
+
+# Upper bound on points per bulk radius validation request
+_BULK_VALIDATE_MAX_POINTS = 10000
+
+# Monday-Friday days in a partial week, indexed by [start weekday][length]
+_PARTIAL_WEEK_WORKING_DAYS = tuple(
+    tuple(sum(1 for i in range(length) if (weekday + i) % 7 < 5) for length in range(7))
+    for weekday in range(7)
+)
+
+
+def _count_working_days(start, end):
+    """Count Monday-Friday days from start to end, both inclusive"""
+    days = (end - start).days + 1
+    if days <= 0:
+        return 0
+    full_weeks, remainder = divmod(days, 7)
+    return full_weeks * 5 + _PARTIAL_WEEK_WORKING_DAYS[start.weekday()][remainder]
+
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters between two points given in degrees"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    half_dphi = (phi2 - phi1) / 2
+    half_dlambda = math.radians(lon2 - lon1) / 2
+    a = math.sin(half_dphi) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(half_dlambda) ** 2
+    return 2 * _EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _haversine_np(lat1, lon1, lat2, lon2):
+    """Vectorized _haversine_m over NumPy arrays (or scalars broadcast against them)"""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    half_dphi = (phi2 - phi1) / 2
+    half_dlambda = np.radians(np.subtract(lon2, lon1)) / 2
+    a = np.sin(half_dphi) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(half_dlambda) ** 2
+    return 2 * _EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+# Lightweight rows returned by AttendanceController._get_user_and_employee
+_SessionUser = namedtuple('_SessionUser', ['id', 'login', 'company_id'])
+_SessionEmployee = namedtuple('_SessionEmployee', ['id', 'name', 'company_id'])
+
+
 class AttendanceController(http.Controller):
     
     def _format_time_local(self, dt):
@@ -16,35 +87,42 @@ class AttendanceController(http.Controller):
         if not dt:
             return ''
         
-        # Convert to Indonesia timezone (WIB = UTC+7)
-        indonesia_tz = pytz.timezone('Asia/Jakarta')
-        
         # If dt is naive (no timezone), assume it's stored in UTC and convert to WIB
         if dt.tzinfo is None:
             # Assume stored time is in UTC, convert to WIB
-            utc_dt = pytz.utc.localize(dt)
-            local_dt = utc_dt.astimezone(indonesia_tz)
+            utc_dt = dt.replace(tzinfo=_UTC)
+            local_dt = utc_dt.astimezone(_JAKARTA_TZ)
         else:
-            local_dt = dt.astimezone(indonesia_tz)
+            local_dt = dt.astimezone(_JAKARTA_TZ)
         
         # Format as HH:MM AM/PM
         formatted_time = local_dt.strftime('%I:%M %p')
-        _logger.info(f"[TIME FORMAT] Input: {dt} -> UTC assumed -> WIB: {local_dt} -> Formatted: {formatted_time}")
+        _logger.debug("[TIME FORMAT] Input: %s -> UTC assumed -> WIB: %s -> Formatted: %s", dt, local_dt, formatted_time)
         return formatted_time
     
+    @staticmethod
+    def _fmt_wib_naive_utc(dt):
+        """Format a naive UTC datetime (as stored by Odoo) as WIB HH:MM AM/PM"""
+        return dt.replace(tzinfo=_UTC).astimezone(_JAKARTA_TZ).strftime('%I:%M %p')
+    
+    @staticmethod
+    def _fmt_hms(duration):
+        """Format a timedelta as HH:MM:SS, with hours not wrapped at 24"""
+        minutes, seconds = divmod(int(duration.total_seconds()), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    
     def _get_current_datetime_local(self):
         """Get current datetime in local timezone"""
-        indonesia_tz = pytz.timezone('Asia/Jakarta')
-        return datetime.now(indonesia_tz)
+        return datetime.now(_JAKARTA_TZ)
     
     def _cors_headers(self):
-        """Return CORS headers for API responses"""
-        return {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Requested-With',
-            'Access-Control-Max-Age': '86400',
-        }
+        """Return CORS headers for API responses (shared, do not mutate)"""
+        return _CORS_HEADERS
+    
+    def _handle_options(self):
+        """Answer a CORS preflight before any session or database work"""
+        return request.make_response('', headers=_CORS_HEADERS, status=204)
     
     def _json_response(self, data=None, success=True, message="", status=200):
         """Standard JSON response format"""
@@ -52,11 +130,13 @@ class AttendanceController(http.Controller):
             'success': success,
             'message': message,
             'data': data,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now()
         }
         
+        # orjson serializes datetimes natively and returns bytes, so the
+        # body goes out without a separate str -> utf-8 encode step
         response = request.make_response(
-            json.dumps(response_data, default=str),
+            orjson.dumps(response_data, default=str),
             headers={
                 'Content-Type': 'application/json',
                 **self._cors_headers()
@@ -74,57 +154,97 @@ class AttendanceController(http.Controller):
             status=status
         )
     
+    def _get_session_uid(self):
+        """Get the user ID bound to the request's Bearer token, if any"""
+        # Check Authorization header first
+        auth_header = request.httprequest.headers.get('Authorization', '')
+        
+        if auth_header.startswith('Bearer '):
+            session_token = auth_header.replace('Bearer ', '')
+            _logger.debug("Attendance request with Bearer token: %s...", session_token[:10])
+            
+            # Use session manager for lookup
+            uid = session_manager.get_user_id(session_token)
+            _logger.debug("Session manager returned user ID: %s", uid)
+            
+            if not uid:
+                _logger.warning("Session token not found in session manager")
+            return uid
+        
+        _logger.warning("No valid Authorization header found")
+        return None
+    
     def _get_user_from_session(self):
         """Get user from session using simplified authentication"""
         try:
-            # Check Authorization header first
-            auth_header = request.httprequest.headers.get('Authorization', '')
-            _logger.info(f"Auth header received: {auth_header[:50]}...")
-            
-            if auth_header.startswith('Bearer '):
-                session_token = auth_header.replace('Bearer ', '')
-                _logger.info(f"Attendance request with Bearer token: {session_token[:10]}...")
-                
-                # Use session manager for lookup
-                from .session_manager import session_manager
-                uid = session_manager.get_user_id(session_token)
-                _logger.info(f"Session manager returned user ID: {uid}")
-                
-                if uid:
-                    user = request.env['res.users'].sudo().browse(uid)
-                    if user.exists():
-                        _logger.info(f"Found user: {user.name} (ID: {user.id})")
-                        return user
-                    else:
-                        _logger.warning(f"User ID {uid} not found in database")
+            uid = self._get_session_uid()
+            if uid:
+                user = request.env['res.users'].sudo().browse(uid)
+                if user.exists():
+                    _logger.info("Found user: %s (ID: %s)", user.name, user.id)
+                    return user
                 else:
-                    _logger.warning(f"Session token not found in session manager")
-                    # Debug: Print all sessions
-                    _logger.warning(f"Available sessions: {list(session_manager._sessions.keys())}")
-            else:
-                _logger.warning("No valid Authorization header found")
+                    _logger.warning(f"User ID {uid} not found in database")
                         
         except Exception as e:
             _logger.error(f"Session lookup error: {str(e)}")
             
         return None
+    
+    def _get_user_and_employee(self):
+        """Get the session user and their employee with one joined query
+
+        Returns (_SessionUser, _SessionEmployee) for handlers that only need
+        ids and names; the user is None when unauthenticated and the employee
+        None when the user has no active employee. Database errors propagate,
+        so handlers answer them as server errors rather than 401. Handlers
+        that write through the ORM should use _get_user_from_session instead.
+        """
+        try:
+            uid = self._get_session_uid()
+            if uid:
+                request.env.cr.execute("""
+                    SELECT u.id, u.login, u.company_id, e.id, e.name, e.company_id
+                    FROM res_users u
+                    LEFT JOIN hr_employee e ON e.user_id = u.id AND e.active
+                    WHERE u.id = %s
+                    ORDER BY e.name, e.id
+                    LIMIT 1
+                """, (uid,))
+                row = request.env.cr.fetchone()
+                if row:
+                    _logger.info("Found user: %s (ID: %s)", row[1], row[0])
+                    employee = _SessionEmployee(*row[3:]) if row[3] else None
+                    return _SessionUser(*row[:3]), employee
+                _logger.warning("User ID %s not found in database", uid)
+                
+        except Exception as e:
+            _logger.error("Session lookup error: %s", e, exc_info=True)
+            raise
+            
+        return None, None
 
     def _calculate_absent_days(self, employee, month, year):
         """Calculate absent days for an employee in a given month and year"""
-        indonesia_tz = pytz.timezone('Asia/Jakarta')
-        absent_days = 0
         total_days = calendar.monthrange(year, month)[1]
+        month_start = datetime(year, month, 1)
+        next_month_start = month_start + timedelta(days=total_days)
+        
+        # One query for the whole month instead of one per day
+        attendances = request.env['hr.attendance'].sudo().search_read([
+            ('employee_id', '=', employee.id),
+            ('check_in', '>=', month_start),
+            ('check_in', '<', next_month_start),
+        ], ['check_in'])
+        present_dates = {att['check_in'].date() for att in attendances}
+        
+        absent_days = 0
+        now = datetime.now(_JAKARTA_TZ)
         for day in range(1, total_days + 1):
-            date_obj = datetime(year, month, day, tzinfo=indonesia_tz)
-            attendances = request.env['hr.attendance'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('check_in', '>=', date_obj.strftime('%Y-%m-%d 00:00:00')),
-                ('check_in', '<=', date_obj.strftime('%Y-%m-%d 23:59:59')),
-            ])
+            day_date = date(year, month, day)
             # If no check-in at all until 5:00 PM
-            if not attendances:
-                now = datetime.now(indonesia_tz)
-                if now.date() > date_obj.date() or (now.date() == date_obj.date() and now.time() >= time(17, 0)):
+            if day_date not in present_dates:
+                if now.date() > day_date or (now.date() == day_date and now.time() >= _END_OF_DAY):
                     absent_days += 1
         return absent_days
 
@@ -132,7 +252,7 @@ class AttendanceController(http.Controller):
     def get_dashboard_data(self):
         """Get attendance dashboard data for current user"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
             
         try:
             # Get user from session
@@ -141,8 +261,9 @@ class AttendanceController(http.Controller):
                 return self._error_response("Authentication required", 401)
             
             # Get current date info
-            today = datetime.now().date()
+            today = date.today()
             current_month_start = today.replace(day=1)
+            tomorrow_start = datetime.combine(today + timedelta(days=1), time.min)
             
             # Check if user has employee record
             employee = request.env['hr.employee'].sudo().search([
@@ -162,82 +283,73 @@ class AttendanceController(http.Controller):
                     'work_email': user.email,
                     'company_id': company_id,
                 })
+                session_manager.invalidate_profile_on_commit(request.env.cr, user.id)
             
             # Get today's attendance
-            today_attendance = request.env['hr.attendance'].sudo().search([
+            today_attendances = request.env['hr.attendance'].sudo().search_read([
                 ('employee_id', '=', employee.id),
-                ('check_in', '>=', today.strftime('%Y-%m-%d 00:00:00')),
-                ('check_in', '<', (today + timedelta(days=1)).strftime('%Y-%m-%d 00:00:00'))
-            ], order='check_in desc', limit=1)
+                ('check_in', '>=', datetime.combine(today, time.min)),
+                ('check_in', '<', tomorrow_start)
+            ], ['check_in', 'check_out'], order='check_in desc', limit=1)
+            today_attendance = today_attendances[0] if today_attendances else None
             
             # Calculate current status
-            is_checked_in = bool(today_attendance and not today_attendance.check_out)
-            check_in_time = self._format_time_local(today_attendance.check_in) if today_attendance and today_attendance.check_in else ''
-            check_out_time = self._format_time_local(today_attendance.check_out) if today_attendance and today_attendance.check_out else ''
+            is_checked_in = bool(today_attendance and not today_attendance['check_out'])
+            check_in_time = self._fmt_wib_naive_utc(today_attendance['check_in']) if today_attendance and today_attendance['check_in'] else ''
+            check_out_time = self._fmt_wib_naive_utc(today_attendance['check_out']) if today_attendance and today_attendance['check_out'] else ''
             
             # Calculate working hours
             working_hours = '00:00:00'
-            if today_attendance and today_attendance.check_in:
-                if today_attendance.check_out:
+            if today_attendance and today_attendance['check_in']:
+                if today_attendance['check_out']:
                     # Calculate actual working hours using UTC times (both stored in UTC)
-                    check_in_utc = today_attendance.check_in
-                    check_out_utc = today_attendance.check_out
+                    check_in_utc = today_attendance['check_in']
+                    check_out_utc = today_attendance['check_out']
                     
                     # Ensure both times are treated as UTC if they are naive
                     if check_in_utc.tzinfo is None:
-                        check_in_utc = pytz.utc.localize(check_in_utc)
+                        check_in_utc = check_in_utc.replace(tzinfo=_UTC)
                     if check_out_utc.tzinfo is None:
-                        check_out_utc = pytz.utc.localize(check_out_utc)
+                        check_out_utc = check_out_utc.replace(tzinfo=_UTC)
                     
                     # Calculate duration using UTC times (no timezone conversion needed for calculation)
                     duration = check_out_utc - check_in_utc
-                    hours = int(duration.total_seconds() // 3600)
-                    minutes = int((duration.total_seconds() % 3600) // 60)
-                    seconds = int(duration.total_seconds() % 60)
-                    working_hours = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+                    working_hours = self._fmt_hms(duration)
                     
                     # Debug logging for dashboard working hours
-                    _logger.info(f"[DASHBOARD WORKING HOURS] Check-in UTC: {check_in_utc}, Check-out UTC: {check_out_utc}")
-                    _logger.info(f"[DASHBOARD WORKING HOURS] Duration: {duration}, Working hours: {working_hours}")
+                    if _logger.isEnabledFor(logging.DEBUG):
+                        _logger.debug("[DASHBOARD WORKING HOURS] Check-in UTC: %s, Check-out UTC: %s", check_in_utc, check_out_utc)
+                        _logger.debug("[DASHBOARD WORKING HOURS] Duration: %s, Working hours: %s", duration, working_hours)
                 else:
                     # Calculate current working hours (still checked in)
-                    check_in_utc = today_attendance.check_in
-                    now = self._get_current_datetime_local()
+                    check_in_utc = today_attendance['check_in']
+                    if check_in_utc.tzinfo is not None:
+                        check_in_utc = check_in_utc.astimezone(_UTC).replace(tzinfo=None)
+                    now_utc = datetime.utcnow()
                     
-                    # Convert both times to the same timezone for accurate calculation
-                    indonesia_tz = pytz.timezone('Asia/Jakarta')
-                    
-                    # Convert check_in from UTC to local timezone
-                    if check_in_utc.tzinfo is None:
-                        # If stored as naive datetime, treat as UTC
-                        check_in_utc = pytz.utc.localize(check_in_utc)
-                    check_in_local = check_in_utc.astimezone(indonesia_tz)
-                    
-                    # Calculate duration between local times
-                    duration = now - check_in_local
-                    hours = int(duration.total_seconds() // 3600)
-                    minutes = int((duration.total_seconds() % 3600) // 60)
-                    seconds = int(duration.total_seconds() % 60)
-                    working_hours = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+                    # Duration needs no timezone: both sides are naive UTC
+                    duration = now_utc - check_in_utc
+                    working_hours = self._fmt_hms(duration)
                     
                     # Debug logging for working hours calculation while checked in
-                    _logger.info(f"[DASHBOARD CURRENT WORKING HOURS] Check-in UTC: {check_in_utc}")
-                    _logger.info(f"[DASHBOARD CURRENT WORKING HOURS] Check-in Local: {check_in_local}")
-                    _logger.info(f"[DASHBOARD CURRENT WORKING HOURS] Now Local: {now}")
-                    _logger.info(f"[DASHBOARD CURRENT WORKING HOURS] Duration: {duration}, Working hours: {working_hours}")
-                    minutes = int((duration.total_seconds() % 3600) // 60)
-                    seconds = int(duration.total_seconds() % 60)
-                    working_hours = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            
-            # Get monthly attendance summary
-            monthly_attendances = request.env['hr.attendance'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('check_in', '>=', current_month_start.strftime('%Y-%m-%d 00:00:00')),
-                ('check_in', '<', datetime.now().strftime('%Y-%m-%d 23:59:59'))
-            ])
-            
-            # Calculate attendance statistics
-            present_days = len(set(att.check_in.date() for att in monthly_attendances if att.check_in))
+                    if _logger.isEnabledFor(logging.DEBUG):
+                        _logger.debug("[DASHBOARD CURRENT WORKING HOURS] Check-in UTC: %s", check_in_utc)
+                        _logger.debug("[DASHBOARD CURRENT WORKING HOURS] Now UTC: %s", now_utc)
+                        _logger.debug("[DASHBOARD CURRENT WORKING HOURS] Duration: %s, Working hours: %s", duration, working_hours)
+            
+            # Calculate attendance statistics and late arrivals (assuming
+            # 10:30 AM WIB is standard time) in one aggregate query; a day
+            # with several late check-ins counts as one late day
+            request.env.cr.execute("""
+                SELECT COUNT(DISTINCT check_in::date),
+                       COUNT(DISTINCT wib_check_in::date) FILTER (WHERE wib_check_in::time > %s)
+                FROM (
+                    SELECT check_in, check_in AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Jakarta' AS wib_check_in
+                    FROM hr_attendance
+                    WHERE employee_id = %s AND check_in >= %s AND check_in < %s
+                ) month_attendances
+            """, (_STANDARD_TIME, employee.id, datetime.combine(current_month_start, time.min), tomorrow_start))
+            present_days, late_days = request.env.cr.fetchone()
             
             # Calculate working days in current month - FIX: Only count days since employee creation
             # Get employee creation date
@@ -246,13 +358,8 @@ class AttendanceController(http.Controller):
             # For new employees, start counting from their creation date, not from start of month
             start_counting_date = max(current_month_start, employee_creation_date)
             
-            # Only count working days from creation date to today (or end of month)
-            working_days = 0
-            current_date = start_counting_date
-            while current_date <= today:
-                if current_date.weekday() < 5:  # Monday to Friday (0-4)
-                    working_days += 1
-                current_date += timedelta(days=1)
+            # Only count working days (Monday to Friday) from creation date to today
+            working_days = _count_working_days(start_counting_date, today)
             
             # For new employees with no attendance history, absent days should be 0 initially
             if present_days == 0 and employee_creation_date >= today:
@@ -262,27 +369,13 @@ class AttendanceController(http.Controller):
                 absent_days = max(0, working_days - present_days)
                 
             # Debug logging
-            _logger.info(f"Employee {employee.name} attendance calculation:")
-            _logger.info(f"  - Creation date: {employee_creation_date}")
-            _logger.info(f"  - Start counting from: {start_counting_date}")
-            _logger.info(f"  - Working days: {working_days}")
-            _logger.info(f"  - Present days: {present_days}")
-            _logger.info(f"  - Absent days: {absent_days}")
-            
-            # Calculate late arrivals (assuming 10:30 AM is standard time)
-            late_days = 0
-            standard_time = time(10, 30)  # 10:30 AM
-            indonesia_tz = pytz.timezone('Asia/Jakarta')
-            for attendance in monthly_attendances:
-                if attendance.check_in:
-                    # Konversi ke WIB sebelum cek jam
-                    check_in = attendance.check_in
-                    if check_in.tzinfo is None:
-                        check_in = pytz.utc.localize(check_in).astimezone(indonesia_tz)
-                    else:
-                        check_in = check_in.astimezone(indonesia_tz)
-                    if check_in.time() > standard_time:
-                        late_days += 1
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug("Employee %s attendance calculation:", employee.name)
+                _logger.debug("  - Creation date: %s", employee_creation_date)
+                _logger.debug("  - Start counting from: %s", start_counting_date)
+                _logger.debug("  - Working days: %s", working_days)
+                _logger.debug("  - Present days: %s", present_days)
+                _logger.debug("  - Absent days: %s", absent_days)
             
             dashboard_data = {
                 'user_info': {
@@ -313,7 +406,7 @@ class AttendanceController(http.Controller):
     def toggle_checkin_checkout(self):
         """Toggle check-in/check-out for current user with GPS and camera validation"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
             
         try:
             # Get user from session
@@ -322,16 +415,25 @@ class AttendanceController(http.Controller):
                 return self._error_response("Authentication required", 401)
             
             # Get request data for GPS and other info
-            try:
-                data = json.loads(request.httprequest.data.decode('utf-8')) if request.httprequest.data else {}
-            except json.JSONDecodeError:
-                data = {}
+            if request.httprequest.mimetype == 'multipart/form-data':
+                # Photo sent as a file part: its bytes never go through the
+                # JSON decoder or base64
+                data = request.httprequest.form.to_dict()
+                photo = request.httprequest.files.get('camera_image')
+                if photo:
+                    data['camera_image'] = photo.read()
+            else:
+                try:
+                    # orjson parses the raw bytes, no separate utf-8 decode
+                    data = orjson.loads(request.httprequest.data) if request.httprequest.data else {}
+                except orjson.JSONDecodeError:
+                    data = {}
             
             latitude = data.get('latitude')
             longitude = data.get('longitude')
             location = data.get('location', 'Unknown Location')
             notes = data.get('notes', '')
-            camera_image = data.get('camera_image')  # Base64 image from camera
+            camera_image = data.get('camera_image')  # Base64 image from camera, raw bytes if uploaded
             
             # Validate GPS coordinates are provided
             if not latitude or not longitude:
@@ -340,6 +442,11 @@ class AttendanceController(http.Controller):
             # Validate camera image is provided
             if not camera_image:
                 return self._error_response("Camera photo is required for attendance", 400)
+            if isinstance(camera_image, str):
+                try:
+                    camera_image = base64.b64decode(camera_image)
+                except binascii.Error:
+                    return self._error_response("Invalid camera photo encoding", 400)
             
             # Get employee record
             employee = request.env['hr.employee'].sudo().search([
@@ -355,46 +462,26 @@ class AttendanceController(http.Controller):
                     'user_id': user.id,
                     'company_id': company.id,
                 })
-                _logger.info(f"Auto-created employee: {employee.id} for user {user.name}")
+                session_manager.invalidate_profile_on_commit(request.env.cr, user.id)
+                _logger.info("Auto-created employee: %s for user %s", employee.id, user.name)
             
             # Validate GPS radius
             company = employee.company_id or request.env.company
             
-            # Safe access to latitude/longitude with fallback
-            try:
-                office_lat = getattr(company, 'latitude', None) or -6.969182
-                office_lon = getattr(company, 'longitude', None) or 107.629251
-                
-                # If no coordinates set, try to set default
-                if not office_lat or not office_lon:
-                    try:
-                        company.sudo().write({
-                            'latitude': -6.969182,
-                            'longitude': 107.629251
-                        })
-                        office_lat = -6.969182
-                        office_lon = 107.629251
-                        _logger.info(f"[TOGGLE] Set default coordinates for company {company.name}")
-                    except Exception as set_err:
-                        _logger.error(f"[TOGGLE] Failed to set default coordinates: {set_err}")
-                        
-            except AttributeError:
-                # Fallback if fields don't exist
-                office_lat = -6.969182
-                office_lon = 107.629251
-                _logger.warning(f"[TOGGLE] Company latitude/longitude fields not found, using default coordinates")
+            # Fall back to the default office when the company has no coordinates
+            office_lat = company.latitude or _DEFAULT_OFFICE_COORDINATES[0]
+            office_lon = company.longitude or _DEFAULT_OFFICE_COORDINATES[1]
             
-            _logger.info(f"[TOGGLE] GPS Check - office: ({office_lat}, {office_lon}), user: ({latitude}, {longitude})")
+            _logger.info("[TOGGLE] GPS Check - office: (%s, %s), user: (%s, %s)", office_lat, office_lon, latitude, longitude)
             
             try:
                 user_lat_f = float(latitude)
                 user_lon_f = float(longitude)
                 office_lat_f = float(office_lat)
                 office_lon_f = float(office_lon)
-                distance = geodesic((user_lat_f, user_lon_f), (office_lat_f, office_lon_f)).meters
-                within_radius = self._is_within_radius(latitude, longitude, office_lat, office_lon, 100000)
+                distance, within_radius = self._distance_and_within(user_lat_f, user_lon_f, office_lat_f, office_lon_f, 100000)
                 
-                _logger.info(f"[TOGGLE] Distance: {distance} meter, Within radius: {within_radius}")
+                _logger.info("[TOGGLE] Distance: %s meter, Within radius: %s", distance, within_radius)
                 
                 if not within_radius:
                     return self._error_response(f"Anda di luar area kantor. Jarak: {distance/1000:.2f} km dari kantor (max: 2.0 km)", 400)
@@ -404,11 +491,11 @@ class AttendanceController(http.Controller):
                 return self._error_response("Error validating location", 500)
             
             # Check attendance for today - enforce one check-in/check-out cycle per day
-            today = datetime.now().date()
+            today_start = datetime.combine(date.today(), time.min)
             today_attendance = request.env['hr.attendance'].sudo().search([
                 ('employee_id', '=', employee.id),
-                ('check_in', '>=', today.strftime('%Y-%m-%d 00:00:00')),
-                ('check_in', '<', (today + timedelta(days=1)).strftime('%Y-%m-%d 00:00:00'))
+                ('check_in', '>=', today_start),
+                ('check_in', '<', today_start + timedelta(days=1))
             ], limit=1)
             
             if today_attendance:
@@ -418,46 +505,33 @@ class AttendanceController(http.Controller):
                     try:
                         check_out_time = self._get_current_datetime_local()
                         # Convert WIB to UTC for storage
-                        check_out_utc = check_out_time.astimezone(pytz.UTC).replace(tzinfo=None)
+                        check_out_utc = check_out_time.astimezone(_UTC).replace(tzinfo=None)
                         
-                        # Simple direct SQL update to avoid ORM constraints
-                        _logger.info(f"Updating checkout for attendance ID: {today_attendance.id}")
+                        _logger.info("Updating checkout for attendance ID: %s", today_attendance.id)
                         
-                        # Calculate working hours using UTC times
+                        # ORM write keeps the record cache coherent; the
+                        # hr.attendance write() override fills working_hours
+                        today_attendance.write({'check_out': check_out_utc})
                         check_in_utc = today_attendance.check_in
-                        duration = check_out_utc - check_in_utc
-                        hours = int(duration.total_seconds() // 3600)
-                        minutes = int((duration.total_seconds() % 3600) // 60)
-                        seconds = int(duration.total_seconds() % 60)
-                        working_hours = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                        
-                        # Update both check_out and working_hours in single SQL query
-                        request.env.cr.execute("""
-                            UPDATE hr_attendance 
-                            SET check_out = %s, working_hours = %s 
-                            WHERE id = %s AND check_out IS NULL
-                        """, (check_out_utc, working_hours, today_attendance.id))
+                        working_hours = today_attendance.working_hours
                         
-                        # Check if update was successful
-                        if request.env.cr.rowcount == 0:
-                            return self._error_response("Failed to update checkout", 500)
-                        
-                        # Commit the transaction
-                        request.env.cr.commit()
-                        _logger.info(f"Checkout committed successfully for attendance ID: {today_attendance.id}")
+                        # Odoo commits once at the end of the request
+                        attendance_id = today_attendance.id
+                        request.env.cr.postcommit.add(
+                            lambda: _logger.info("Checkout committed successfully for attendance ID: %s", attendance_id)
+                        )
                         
                         # Debug logging for working hours calculation
-                        _logger.info(f"[TOGGLE WORKING HOURS] Check-in UTC: {check_in_utc}")
-                        _logger.info(f"[TOGGLE WORKING HOURS] Check-out UTC: {check_out_utc}")
-                        _logger.info(f"[TOGGLE WORKING HOURS] Duration: {duration}")
-                        _logger.info(f"[TOGGLE WORKING HOURS] Working hours: {working_hours}")
-                        _logger.info(f"[TOGGLE WORKING HOURS] Working hours: {working_hours}")
+                        if _logger.isEnabledFor(logging.DEBUG):
+                            _logger.debug("[TOGGLE WORKING HOURS] Check-in UTC: %s", check_in_utc)
+                            _logger.debug("[TOGGLE WORKING HOURS] Check-out UTC: %s", check_out_utc)
+                            _logger.debug("[TOGGLE WORKING HOURS] Working hours: %s", working_hours)
                         
-                        check_out_formatted = self._format_time_local(check_out_utc)
+                        check_out_formatted = self._fmt_wib_naive_utc(check_out_utc)
                         
                         # Log attendance with GPS and camera info
-                        _logger.info(f"[TOGGLE CHECKOUT] Employee: {employee.name}, Location: {location}, GPS: ({latitude}, {longitude}), Distance: {distance/1000:.2f} km")
-                        _logger.info(f"[TOGGLE CHECKOUT] WIB time: {check_out_time} -> UTC stored: {check_out_utc} -> formatted: {check_out_formatted}")
+                        _logger.info("[TOGGLE CHECKOUT] Employee: %s, Location: %s, GPS: (%s, %s), Distance: %.2f km", employee.name, location, latitude, longitude, distance/1000)
+                        _logger.info("[TOGGLE CHECKOUT] WIB time: %s -> UTC stored: %s -> formatted: %s", check_out_time, check_out_utc, check_out_formatted)
                         
                         return self._json_response({
                             'action': 'check_out',
@@ -485,25 +559,22 @@ class AttendanceController(http.Controller):
                 try:
                     check_in_time = self._get_current_datetime_local()
                     # Convert WIB to UTC for storage
-                    check_in_utc = check_in_time.astimezone(pytz.UTC).replace(tzinfo=None)
+                    check_in_utc = check_in_time.astimezone(_UTC).replace(tzinfo=None)
                     
                     # Create new attendance record with UTC time
                     attendance = request.env['hr.attendance'].sudo().create({
                         'employee_id': employee.id,
                         'check_in': check_in_utc,
-                        'selfie_photo': camera_image,  # base64 string dari frontend
                         'latitude': latitude,          # string dari frontend
                         'longitude': longitude,        # string dari frontend
                     })
+                    self._store_selfie(attendance, camera_image)
                     
-                    # Force commit the transaction
-                    request.env.cr.commit()
-                    
-                    check_in_formatted = self._format_time_local(check_in_utc)
+                    check_in_formatted = self._fmt_wib_naive_utc(check_in_utc)
                     
                     # Log attendance with GPS and camera info
-                    _logger.info(f"[TOGGLE CHECKIN] Employee: {employee.name}, Location: {location}, GPS: ({latitude}, {longitude}), Distance: {distance/1000:.2f} km")
-                    _logger.info(f"[TOGGLE CHECKIN] WIB time: {check_in_time} -> UTC stored: {check_in_utc} -> formatted: {check_in_formatted}")
+                    _logger.info("[TOGGLE CHECKIN] Employee: %s, Location: %s, GPS: (%s, %s), Distance: %.2f km", employee.name, location, latitude, longitude, distance/1000)
+                    _logger.info("[TOGGLE CHECKIN] WIB time: %s -> UTC stored: %s -> formatted: %s", check_in_time, check_in_utc, check_in_formatted)
                     
                     return self._json_response({
                         'action': 'check_in',
@@ -532,22 +603,34 @@ class AttendanceController(http.Controller):
                 pass
             return self._error_response(f"Error during check-in/out: {str(e)}", 500)
 
-    def _is_within_radius(self, user_lat, user_lon, office_lat, office_lon, radius_m=10000):
-        try:
-            user_loc = (float(user_lat), float(user_lon))
-            office_loc = (float(office_lat), float(office_lon))
-            distance = geodesic(user_loc, office_loc).meters
-            _logger.info(f"[RADIUS CHECK] user_loc={user_loc}, office_loc={office_loc}, distance={distance}, radius={radius_m}")
-            return distance <= radius_m
-        except Exception as e:
-            _logger.error(f"Radius check error: {str(e)} | user_lat={user_lat}, user_lon={user_lon}, office_lat={office_lat}, office_lon={office_lon}")
-            return False
+    def _distance_and_within(self, user_lat, user_lon, office_lat, office_lon, radius_m=10000):
+        """Return (distance in meters, whether it is within radius_m) for parsed float coordinates"""
+        distance = _haversine_m(user_lat, user_lon, office_lat, office_lon)
+        _logger.debug("[RADIUS CHECK] user_loc=%s, office_loc=%s, distance=%s, radius=%s", (user_lat, user_lon), (office_lat, office_lon), distance, radius_m)
+        return distance, distance <= radius_m
+
+    def _store_selfie(self, attendance, photo):
+        """Attach raw selfie bytes to attendance as its selfie_photo
+
+        selfie_photo is an attachment-backed Binary field; this creates the
+        same ir.attachment the field would, straight from bytes instead of
+        a base64 string the ORM has to decode again.
+        """
+        if photo:
+            request.env['ir.attachment'].sudo().create({
+                'name': 'selfie_photo',
+                'res_model': 'hr.attendance',
+                'res_field': 'selfie_photo',
+                'res_id': attendance.id,
+                'type': 'binary',
+                'raw': photo,
+            })
 
     @http.route('/api/attendance/checkin', type='http', auth='none', methods=['POST', 'OPTIONS'], csrf=False)
     def check_in(self):
         """Employee check-in"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
         
         try:
             # Get user from session using our authentication method
@@ -557,21 +640,36 @@ class AttendanceController(http.Controller):
             
 
             # Get request data (tanpa employee_id)
-            data = json.loads(request.httprequest.data.decode('utf-8'))
+            data = orjson.loads(request.httprequest.data)
             location = data.get('location')
             notes = data.get('notes', '')
             latitude = data.get('latitude')
             longitude = data.get('longitude')
+            
+            # Coerce the user's coordinates once, before any lookup
+            try:
+                user_lat_f = float(latitude)
+                user_lon_f = float(longitude)
+            except (TypeError, ValueError):
+                return self._error_response("Invalid coordinate format", 400)
+            
+            # Decode the selfie once; it is stored as raw attachment bytes
+            try:
+                selfie_photo = base64.b64decode(data['selfie_photo']) if data.get('selfie_photo') else None
+            except binascii.Error:
+                return self._error_response("Invalid selfie photo encoding", 400)
 
-            _logger.info(f"[CHECKIN] user={user.name}, lat={latitude}, lon={longitude}, location={location}, notes={notes}")
+            _logger.info("[CHECKIN] user=%s, lat=%s, lon=%s, location=%s, notes=%s", user.name, latitude, longitude, location, notes)
 
             # Pastikan hanya satu employee per user
-            employees = request.env['hr.employee'].sudo().search([('user_id', '=', user.id)])
+            # limit=2 is enough to tell none / one / duplicates apart
+            employees = request.env['hr.employee'].sudo().search([('user_id', '=', user.id)], limit=2)
             if len(employees) > 1:
                 # Jika ada lebih dari satu, update user_id employee lain ke None
-                for emp in employees[1:]:
-                    emp.sudo().write({'user_id': False})
+                employees = request.env['hr.employee'].sudo().search([('user_id', '=', user.id)])
+                employees[1:].write({'user_id': False})
                 employee = employees[0]
+                session_manager.invalidate_profile_on_commit(request.env.cr, user.id)
             elif len(employees) == 1:
                 employee = employees[0]
             else:
@@ -583,7 +681,8 @@ class AttendanceController(http.Controller):
                     'user_id': user.id,
                     'company_id': company.id,
                 })
-                _logger.info(f"[CHECKIN] Auto-created employee: {employee.id} for user {user.name}")
+                session_manager.invalidate_profile_on_commit(request.env.cr, user.id)
+                _logger.info("[CHECKIN] Auto-created employee: %s for user %s", employee.id, user.name)
 
             # Validasi radius dan hitung distance
             company = employee.company_id or request.env.company
@@ -592,17 +691,12 @@ class AttendanceController(http.Controller):
             distance = 0.0
             within_radius = True
             
-            _logger.info(f"[CHECKIN] office_lat={office_lat}, office_lon={office_lon}, user_lat={latitude}, user_lon={longitude}")
+            _logger.info("[CHECKIN] office_lat=%s, office_lon=%s, user_lat=%s, user_lon=%s", office_lat, office_lon, latitude, longitude)
             
             try:
-                user_lat_f = float(latitude)
-                user_lon_f = float(longitude)
-                office_lat_f = float(office_lat)
-                office_lon_f = float(office_lon)
-                distance = geodesic((user_lat_f, user_lon_f), (office_lat_f, office_lon_f)).meters
-                within_radius = self._is_within_radius(latitude, longitude, office_lat, office_lon, 100000)
+                distance, within_radius = self._distance_and_within(user_lat_f, user_lon_f, office_lat, office_lon, 100000)
                 
-                _logger.info(f"[CHECKIN] DISTANCE: {distance} meter, RADIUS: 2000 meter, WITHIN_RADIUS: {within_radius}")
+                _logger.info("[CHECKIN] DISTANCE: %s meter, RADIUS: 2000 meter, WITHIN_RADIUS: %s", distance, within_radius)
                 
                 if not within_radius:
                     _logger.warning(f"[CHECKIN] OUTSIDE RADIUS: user=({latitude},{longitude}), office=({office_lat},{office_lon})")
@@ -612,50 +706,43 @@ class AttendanceController(http.Controller):
                 _logger.error(f"[CHECKIN] Error calculating distance: {e}")
                 # Continue dengan asumsi dalam radius jika ada error
 
-            # Check if already checked in today
-            today = date.today()
-            existing_attendance = request.env['hr.attendance'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('check_out', '=', False),
-                ('check_in', '>=', f'{today} 00:00:00'),
-                ('check_in', '<=', f'{today} 23:59:59')
-            ], limit=1)
-            
-            if existing_attendance:
-                return self._error_response("Employee is already checked in today", 400)
-            
             # Create check-in record using sudo() to bypass permissions
-            # --- PATCH: Use WIB (Asia/Jakarta) then convert to UTC ---
-            indonesia_tz = pytz.timezone('Asia/Jakarta')
-            now_local = datetime.now(indonesia_tz)
-            now_utc = now_local.astimezone(pytz.UTC).replace(tzinfo=None)
+            # Odoo stores naive UTC, so take the clock in UTC directly
+            now_utc = datetime.utcnow()
             attendance_vals = {
                 'employee_id': employee.id,
                 'check_in': now_utc,
-                'selfie_photo': data.get('selfie_photo'),  # base64 string dari frontend
                 'latitude': latitude,                      # string dari frontend
                 'longitude': longitude,                    # string dari frontend
             }
-            attendance = request.env['hr.attendance'].sudo().create(attendance_vals)
+            # An open attendance already exists when either hr.attendance's own
+            # check or the hr_attendance_open_per_emp unique index (concurrent
+            # taps) rejects the insert; the savepoint keeps the cursor usable
+            try:
+                with request.env.cr.savepoint():
+                    attendance = request.env['hr.attendance'].sudo().create(attendance_vals)
+            except (UniqueViolation, ValidationError):
+                return self._error_response("Employee is already checked in today", 400)
+            self._store_selfie(attendance, selfie_photo)
             
             # Log additional info yang tidak disimpan di database
-            _logger.info(f"[CHECKIN] Additional info - Location: {location}, Lat: {latitude}, Lng: {longitude}, Notes: {notes}")
+            _logger.info("[CHECKIN] Additional info - Location: %s, Lat: %s, Lng: %s, Notes: %s", location, latitude, longitude, notes)
             
             return self._json_response(
                 data={
                     'id': attendance.id,
                     'employee_name': attendance.employee_id.name,
-                    'check_in': attendance.check_in.strftime('%Y-%m-%d %H:%M:%S'),
+                    'check_in': attendance.check_in.isoformat(sep=' ', timespec='seconds'),
                     'location': location,
                     'latitude': latitude,
                     'longitude': longitude,
                     'notes': notes,
-                    'distance_from_office': f"{distance:.2f} km" if 'distance' in locals() else "N/A",
-                    'within_radius': within_radius if 'within_radius' in locals() else True,
+                    'distance_from_office': f"{distance:.2f} km",
+                    'within_radius': within_radius,
                 },
                 message="Check-in successful"
             )
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             return self._error_response(f"Invalid JSON data: {str(e)}", 400)
         except Exception as e:
             _logger.error(f"Check-in error: {str(e)}", exc_info=True)
@@ -665,16 +752,16 @@ class AttendanceController(http.Controller):
     def check_out(self):
         """Employee check-out"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
         
         try:
             # Get user from session using our authentication method
-            user = self._get_user_from_session()
+            user, session_employee = self._get_user_and_employee()
             if not user:
                 return self._error_response("Authentication required", 401)
             
             # Get request data
-            data = json.loads(request.httprequest.data.decode('utf-8'))
+            data = orjson.loads(request.httprequest.data)
             employee_id = data.get('employee_id')
             location = data.get('location')
             notes = data.get('notes', '')
@@ -687,51 +774,56 @@ class AttendanceController(http.Controller):
                     employee = None
             
             if not employee:
-                employee = request.env['hr.employee'].sudo().search([('user_id', '=', user.id)], limit=1)
+                employee = session_employee
             
             if not employee:
                 return self._error_response("Employee not found", 404)
             
-            # Find active check-in for today (broader search to handle timezone issues)
-            attendance = request.env['hr.attendance'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('check_out', '=', False)
-            ], limit=1, order='check_in desc')
-            
-            _logger.info(f"[CHECKOUT] Looking for employee {employee.id}, found attendance: {attendance.id if attendance else 'None'}")
-            
-            if not attendance:
-                return self._error_response("No active check-in found for today", 400)
-            
-            # Update with check-out time using direct SQL to bypass ORM constraints
+            # Close the latest open check-in (broader search to handle timezone
+            # issues) with direct SQL to bypass ORM constraints; finding,
+            # updating and reading it back is a single round-trip
             try:
-                # --- PATCH: Use WIB (Asia/Jakarta) then convert to UTC ---
-                indonesia_tz = pytz.timezone('Asia/Jakarta')
-                checkout_time_local = datetime.now(indonesia_tz)
-                checkout_time_utc = checkout_time_local.astimezone(pytz.UTC).replace(tzinfo=None)
+                # Odoo stores naive UTC, so take the clock in UTC directly
+                checkout_time_utc = datetime.utcnow()
                 
-                # Calculate working hours
-                check_in_utc = attendance.check_in
-                duration = checkout_time_utc - check_in_utc
-                hours = int(duration.total_seconds() // 3600)
-                minutes = int((duration.total_seconds() % 3600) // 60)
-                seconds = int(duration.total_seconds() % 60)
-                working_hours = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+                # Update both check_out and working_hours, the latter as total
+                # HH:MM:SS (hours not wrapped at 24)
+                request.env.cr.execute("""
+                    WITH target AS (
+                        SELECT id FROM hr_attendance
+                        WHERE employee_id = %s AND check_out IS NULL
+                        ORDER BY check_in DESC
+                        LIMIT 1
+                        FOR UPDATE
+                    )
+                    UPDATE hr_attendance a
+                    SET check_out = %s,
+                        working_hours = to_char(
+                            interval '1 second' * EXTRACT(EPOCH FROM %s - a.check_in),
+                            'HH24:MI:SS'
+                        )
+                    FROM target
+                    WHERE a.id = target.id
+                    RETURNING a.id, a.check_in
+                """, (employee.id, checkout_time_utc, checkout_time_utc))
+                closed = request.env.cr.fetchone()
                 
-                # Update both check_out and working_hours
-                request.env.cr.execute(
-                    "UPDATE hr_attendance SET check_out = %s, working_hours = %s WHERE id = %s",
-                    (checkout_time_utc, working_hours, attendance.id)
-                )
-                request.env.cr.commit()
+                _logger.info("[CHECKOUT] Looking for employee %s, found attendance: %s", employee.id, closed[0] if closed else 'None')
+                
+                if not closed:
+                    return self._error_response("No active check-in found for today", 400)
+                attendance_id, check_in_utc = closed
+                # Odoo commits at the end of the request; just drop any cached
+                # values the raw UPDATE made stale
+                request.env['hr.attendance'].invalidate_model(['check_out', 'working_hours'])
                 
                 # Build response data manually since we updated via SQL
                 return self._json_response(
                     data={
-                        'id': attendance.id,
+                        'id': attendance_id,
                         'employee_name': employee.name,
-                        'check_in': attendance.check_in.strftime('%Y-%m-%d %H:%M:%S'),
-                        'check_out': checkout_time_utc.strftime('%Y-%m-%d %H:%M:%S'),
+                        'check_in': check_in_utc.isoformat(sep=' ', timespec='seconds'),
+                        'check_out': checkout_time_utc.isoformat(sep=' ', timespec='seconds'),
                         'location': location,
                         'notes': notes,
                     },
@@ -742,17 +834,77 @@ class AttendanceController(http.Controller):
                 _logger.error(f"Direct SQL update failed: {str(sql_error)}")
                 return self._error_response("Failed to record check-out time", 500)
             
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             return self._error_response("Invalid JSON data", 400)
         except Exception as e:
             _logger.error(f"Check-out error: {str(e)}")
             return self._error_response("Check-out failed", 500)
     
+    @http.route('/api/attendance/validate_bulk', type='http', auth='none', methods=['POST', 'OPTIONS'], csrf=False)
+    def validate_bulk(self):
+        """Check many GPS points against the office radius in one vector operation"""
+        if request.httprequest.method == 'OPTIONS':
+            return self._handle_options()
+        
+        try:
+            user = self._get_user_from_session()
+            if not user:
+                return self._error_response("Authentication required", 401)
+            
+            data = orjson.loads(request.httprequest.data)
+            if not isinstance(data, dict):
+                return self._error_response("Request body must be a JSON object", 400)
+            points = data.get('points') or []
+            if not isinstance(points, list):
+                return self._error_response("points must be a list", 400)
+            if len(points) > _BULK_VALIDATE_MAX_POINTS:
+                return self._error_response(f"Too many points (max: {_BULK_VALIDATE_MAX_POINTS})", 400)
+            
+            try:
+                # Same default radius as check-in
+                radius_m = float(data.get('radius_m', 100000))
+                coordinates = np.array(
+                    [(point['latitude'], point['longitude']) for point in points],
+                    dtype=float,
+                ).reshape(-1, 2)
+            except (KeyError, TypeError, ValueError):
+                return self._error_response("Each point needs numeric latitude and longitude", 400)
+            
+            # Same office as check-in and toggle: the employee's company
+            employee = request.env['hr.employee'].sudo().search([
+                ('user_id', '=', user.id)
+            ], limit=1)
+            company = employee.company_id or request.env.company
+            office_lat = company.latitude or _DEFAULT_OFFICE_COORDINATES[0]
+            office_lon = company.longitude or _DEFAULT_OFFICE_COORDINATES[1]
+            
+            distances = _haversine_np(coordinates[:, 0], coordinates[:, 1], office_lat, office_lon)
+            within = distances <= radius_m
+            
+            return self._json_response(
+                data={
+                    'office_latitude': office_lat,
+                    'office_longitude': office_lon,
+                    'radius_m': radius_m,
+                    'results': [
+                        {'distance_m': distance, 'within_radius': inside}
+                        for distance, inside in zip(distances.tolist(), within.tolist())
+                    ],
+                },
+                message="Points validated successfully"
+            )
+            
+        except orjson.JSONDecodeError:
+            return self._error_response("Invalid JSON data", 400)
+        except Exception as e:
+            _logger.error("Bulk validate error: %s", e, exc_info=True)
+            return self._error_response("Failed to validate points", 500)
+    
     @http.route('/api/attendance', type='http', auth='none', methods=['GET', 'OPTIONS'], csrf=False)
     def get_attendance(self):
         """Get attendance records"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
         
         try:
             # Get user from session using our authentication method
@@ -766,30 +918,44 @@ class AttendanceController(http.Controller):
             employee_id = request.httprequest.args.get('employee_id')
             date_from = request.httprequest.args.get('date_from')
             date_to = request.httprequest.args.get('date_to')
+            with_count = request.httprequest.args.get('with_count', '').lower() in ('1', 'true')
             
             # Build domain
             domain = []
             if employee_id:
                 domain.append(('employee_id', '=', int(employee_id)))
-            if date_from:
-                domain.append(('check_in', '>=', f'{date_from} 00:00:00'))
-            if date_to:
-                domain.append(('check_in', '<=', f'{date_to} 23:59:59'))
-            
-            # Get attendance records using sudo()
-            attendances = request.env['hr.attendance'].sudo().search(domain, limit=limit, offset=offset, order='check_in desc')
-            total_count = request.env['hr.attendance'].sudo().search_count(domain)
+            try:
+                if date_from:
+                    domain.append(('check_in', '>=', datetime.combine(date.fromisoformat(date_from[:10]), time.min)))
+                if date_to:
+                    # Half-open bound: everything before the next day starts
+                    domain.append(('check_in', '<', datetime.combine(date.fromisoformat(date_to[:10]) + timedelta(days=1), time.min)))
+            except ValueError:
+                return self._error_response("Invalid date format. Use YYYY-MM-DD", 400)
             
+            # Get attendance records using sudo(); one extra row tells whether
+            # another page exists without counting the whole match set
+            attendances = request.env['hr.attendance'].sudo().search_read(
+                domain, ['employee_id', 'check_in', 'check_out', 'worked_hours'],
+                limit=limit + 1, offset=offset, order='check_in desc')
+            has_more = len(attendances) > limit
+            del attendances[limit:]
+            # Only count when the client asks for it (?with_count=1)
+            total_count = request.env['hr.attendance'].sudo().search_count(domain) if with_count else None
+            
+            # Plain dicts instead of per-record field access;
+            # employee_id comes back as (id, display_name)
             attendance_data = []
             for attendance in attendances:
+                employee_ref = attendance['employee_id']
                 attendance_data.append({
-                    'id': attendance.id,
-                    'employee_name': attendance.employee_id.name,
-                    'employee_id': attendance.employee_id.id,
-                    'check_in': attendance.check_in.strftime('%Y-%m-%d %H:%M:%S'),
-                    'check_out': attendance.check_out.strftime('%Y-%m-%d %H:%M:%S') if attendance.check_out else None,
-                    'worked_hours': attendance.worked_hours,
-                    'date': attendance.check_in.strftime('%Y-%m-%d'),
+                    'id': attendance['id'],
+                    'employee_name': employee_ref[1] if employee_ref else None,
+                    'employee_id': employee_ref[0] if employee_ref else None,
+                    'check_in': attendance['check_in'].isoformat(sep=' ', timespec='seconds'),
+                    'check_out': attendance['check_out'].isoformat(sep=' ', timespec='seconds') if attendance['check_out'] else None,
+                    'worked_hours': attendance['worked_hours'],
+                    'date': attendance['check_in'].date().isoformat(),
                 })
             
             return self._json_response(
@@ -798,7 +964,7 @@ class AttendanceController(http.Controller):
                     'total_count': total_count,
                     'limit': limit,
                     'offset': offset,
-                    'has_more': offset + limit < total_count
+                    'has_more': has_more
                 },
                 message="Attendance records retrieved successfully"
             )
@@ -811,7 +977,7 @@ class AttendanceController(http.Controller):
     def get_attendance_status(self, employee_id):
         """Get current attendance status for employee"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
         
         try:
             # Get user from session using our authentication method
@@ -823,23 +989,24 @@ class AttendanceController(http.Controller):
                 return self._error_response("Employee not found", 404)
             
             # Check today's attendance using sudo()
-            today = date.today()
-            attendance = request.env['hr.attendance'].sudo().search([
+            today_start = datetime.combine(date.today(), time.min)
+            attendances = request.env['hr.attendance'].sudo().search_read([
                 ('employee_id', '=', employee_id),
-                ('check_in', '>=', f'{today} 00:00:00'),
-                ('check_in', '<=', f'{today} 23:59:59')
-            ], limit=1, order='check_in desc')
+                ('check_in', '>=', today_start),
+                ('check_in', '<', today_start + timedelta(days=1))
+            ], ['check_in', 'check_out', 'worked_hours'], limit=1, order='check_in desc')
             
-            if attendance:
+            if attendances:
+                attendance = attendances[0]
                 status_data = {
                     'employee_id': employee_id,
                     'employee_name': employee.name,
-                    'is_checked_in': not attendance.check_out,
-                    'last_attendance_id': attendance.id,
-                    'check_in': attendance.check_in.strftime('%Y-%m-%d %H:%M:%S'),
-                    'check_out': attendance.check_out.strftime('%Y-%m-%d %H:%M:%S') if attendance.check_out else None,
-                    'worked_hours_today': attendance.worked_hours if attendance.check_out else 0,
-                    'status': 'checked_in' if not attendance.check_out else 'checked_out'
+                    'is_checked_in': not attendance['check_out'],
+                    'last_attendance_id': attendance['id'],
+                    'check_in': attendance['check_in'].isoformat(sep=' ', timespec='seconds'),
+                    'check_out': attendance['check_out'].isoformat(sep=' ', timespec='seconds') if attendance['check_out'] else None,
+                    'worked_hours_today': attendance['worked_hours'] if attendance['check_out'] else 0,
+                    'status': 'checked_in' if not attendance['check_out'] else 'checked_out'
                 }
             else:
                 status_data = {
@@ -866,7 +1033,7 @@ class AttendanceController(http.Controller):
     def health_check(self):
         """Simple health check endpoint"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
             
         try:
             return self._json_response(
@@ -885,7 +1052,7 @@ class AttendanceController(http.Controller):
     def update_office_location(self):
         """Update office location coordinates in Odoo company settings"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
             
         try:
             # Get user from session
@@ -894,7 +1061,7 @@ class AttendanceController(http.Controller):
                 return self._error_response("Authentication required", 401)
             
             # Parse request data
-            data = json.loads(request.httprequest.data.decode('utf-8'))
+            data = orjson.loads(request.httprequest.data)
             latitude = data.get('latitude')
             longitude = data.get('longitude')
             
@@ -921,7 +1088,7 @@ class AttendanceController(http.Controller):
                 'longitude': lng_float,
             })
             
-            _logger.info(f"Office location updated by user {user.login}: {lat_float}, {lng_float}")
+            _logger.info("Office location updated by user %s: %s, %s", user.login, lat_float, lng_float)
             
             return self._json_response(
                 data={
@@ -941,7 +1108,7 @@ class AttendanceController(http.Controller):
     def get_office_location(self):
         """Get current office location coordinates from Odoo company settings"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
             
         try:
             # Get user from session
@@ -952,16 +1119,17 @@ class AttendanceController(http.Controller):
             # Get company's office location
             company = user.company_id or request.env.company
             
-            # Fallback coordinates if not set
-            latitude = getattr(company, 'latitude', None) or -6.9866798
-            longitude = getattr(company, 'longitude', None) or 107.629251
+            # One read for everything returned; fallback coordinates if not set
+            company_vals = company.sudo().read(['latitude', 'longitude', 'name'])[0]
+            latitude = company_vals['latitude'] or -6.9866798
+            longitude = company_vals['longitude'] or 107.629251
             
             return self._json_response(
                 data={
                     'latitude': latitude,
                     'longitude': longitude,
-                    'company_id': company.id,
-                    'company_name': company.name
+                    'company_id': company_vals['id'],
+                    'company_name': company_vals['name']
                 },
                 message="Office location retrieved successfully from Odoo"
             )
@@ -974,15 +1142,13 @@ class AttendanceController(http.Controller):
     def get_attendance_history(self):
         """Get attendance history for current user"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
         
         try:
-            user = self._get_user_from_session()
+            user, employee = self._get_user_and_employee()
             if not user:
                 return self._error_response("Authentication required", 401)
             
-            # Get employee
-            employee = request.env['hr.employee'].sudo().search([('user_id', '=', user.id)], limit=1)
             if not employee:
                 return self._error_response("Employee record not found", 404)
             
@@ -990,78 +1156,41 @@ class AttendanceController(http.Controller):
             start_date = request.httprequest.args.get('start_date')
             end_date = request.httprequest.args.get('end_date')
             
-            # Default to last 30 days if not specified
-            if not start_date:
-                start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-            if not end_date:
-                end_date = datetime.now().strftime('%Y-%m-%d')
-            
-            # Parse dates
+            # Parse dates, defaulting to the last 30 days if not specified
+            today = date.today()
             try:
-                start_datetime = datetime.strptime(start_date[:10], '%Y-%m-%d')
-                end_datetime = datetime.strptime(end_date[:10], '%Y-%m-%d')
+                start_day = date.fromisoformat(start_date[:10]) if start_date else today - timedelta(days=30)
+                end_day = date.fromisoformat(end_date[:10]) if end_date else today
             except ValueError:
                 return self._error_response("Invalid date format. Use YYYY-MM-DD", 400)
+            start_datetime = datetime.combine(start_day, time.min)
+            end_datetime = datetime.combine(end_day, time.min)
+            
+            # One row per WIB day: first check-in, last check-out, total time
+            # worked and whether any check-in was after 10:30 AM WIB (late)
+            request.env.cr.execute("""
+                SELECT day, MIN(check_in), MAX(check_out), SUM(check_out - check_in),
+                       BOOL_OR(wib_check_in::time > %s)
+                FROM (
+                    SELECT check_in, check_out,
+                           check_in AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Jakarta' AS wib_check_in,
+                           (check_in AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Jakarta')::date AS day
+                    FROM hr_attendance
+                    WHERE employee_id = %s AND check_in >= %s AND check_in < %s
+                ) range_attendances
+                GROUP BY day
+                ORDER BY day DESC
+            """, (_STANDARD_TIME, employee.id, start_datetime, end_datetime + timedelta(days=1)))
             
-            # Get attendance records
-            attendances = request.env['hr.attendance'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('check_in', '>=', start_datetime),
-                ('check_in', '<=', end_datetime + timedelta(days=1))
-            ], order='check_in desc')
-            
-            # Group by date and format response
             attendance_data = []
-            attendance_by_date = {}
-            
-            indonesia_tz = pytz.timezone('Asia/Jakarta')
-            
-            for attendance in attendances:
-                check_in_date = attendance.check_in.date() if attendance.check_in else None
-                if check_in_date:
-                    date_str = check_in_date.strftime('%Y-%m-%d')
-                    
-                    if date_str not in attendance_by_date:
-                        attendance_by_date[date_str] = {
-                            'date': date_str,
-                            'check_in': None,
-                            'check_out': None,
-                            'working_hours': '00:00:00',
-                            'status': 'Present'
-                        }
-                    
-                    # Check-in time
-                    if attendance.check_in and not attendance_by_date[date_str]['check_in']:
-                        attendance_by_date[date_str]['check_in'] = self._format_time_local(attendance.check_in)
-                    
-                    # Check-out time
-                    if attendance.check_out:
-                        attendance_by_date[date_str]['check_out'] = self._format_time_local(attendance.check_out)
-                        
-                        # Calculate working hours in HH:MM:SS format
-                        if attendance.check_in:
-                            working_duration = attendance.check_out - attendance.check_in
-                            hours = int(working_duration.total_seconds() // 3600)
-                            minutes = int((working_duration.total_seconds() % 3600) // 60)
-                            seconds = int(working_duration.total_seconds() % 60)
-                            attendance_by_date[date_str]['working_hours'] = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                        else:
-                            attendance_by_date[date_str]['working_hours'] = '00:00:00'
-                    
-                    # Determine status (late if check-in after 10:30 AM)
-                    if attendance.check_in:
-                        check_in = attendance.check_in
-                        if check_in.tzinfo is None:
-                            check_in = pytz.utc.localize(check_in).astimezone(indonesia_tz)
-                        else:
-                            check_in = check_in.astimezone(indonesia_tz)
-                        check_in_time = check_in.time()
-                        if check_in_time > time(10, 30):  # Late if after 10:30 AM
-                            attendance_by_date[date_str]['status'] = 'Late'
-            
-            # Convert to list and sort by date
-            attendance_data = list(attendance_by_date.values())
-            attendance_data.sort(key=lambda x: x['date'], reverse=True)
+            for day, first_check_in, last_check_out, worked, is_late in request.env.cr.fetchall():
+                attendance_data.append({
+                    'date': day.isoformat(),
+                    'check_in': self._fmt_wib_naive_utc(first_check_in),
+                    'check_out': self._fmt_wib_naive_utc(last_check_out) if last_check_out else None,
+                    'working_hours': self._fmt_hms(worked) if worked else '00:00:00',
+                    'status': 'Late' if is_late else 'Present',
+                })
             
             return self._json_response(
                 data=attendance_data,
@@ -1,13 +1,88 @@
-﻿import json
+﻿import orjson
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import re
 from datetime import datetime, timedelta
 from odoo import http  # type: ignore
 from odoo.http import request  # type: ignore
+from odoo.exceptions import AccessDenied  # type: ignore
 from .session_manager import session_manager
 from .base_controller import BaseController
 
 _logger = logging.getLogger(__name__)
 
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Password hashing is deliberately slow and releases the GIL, so register
+# runs it here while the request thread checks for conflicts
+_HASH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='hris_pw_hash')
+
+
+def _default_company_id(env):
+    """ID of the company new users and employees are attached to"""
+    return env['res.company']._hris_default_company_id()
+
+
+def _internal_group_id(env):
+    """ID of base.group_user (Internal User)"""
+    # The xmlid lookup is cached by Odoo itself, per registry
+    return env['ir.model.data']._xmlid_to_res_id('base.group_user', raise_if_not_found=True)
+
+
+def _translated(value, lang):
+    """Pick lang out of a translated (jsonb) column value; plain values pass through"""
+    if isinstance(value, dict):
+        return value.get(lang) or value.get('en_US')
+    return value
+
+
+def _fetch_user_profile(cr, uid, lang='en_US'):
+    """Build the API profile of user uid with one joined query
+
+    Covers the user, their partner, their first active employee (by name,
+    like an hr.employee search) and its department and job. Returns None
+    if the user does not exist.
+    """
+    # to_jsonb() reads department/job names the same way whether or not
+    # the column is translated (jsonb) in this database
+    cr.execute("""
+        SELECT u.id, u.login, p.name, p.email, p.phone,
+               e.id, e.name, e.work_phone,
+               d.id, to_jsonb(d.name), j.id, to_jsonb(j.name)
+        FROM res_users u
+        JOIN res_partner p ON p.id = u.partner_id
+        LEFT JOIN LATERAL (
+            SELECT id, name, work_phone, department_id, job_id
+            FROM hr_employee
+            WHERE user_id = u.id AND active
+            ORDER BY name, id
+            LIMIT 1
+        ) e ON true
+        LEFT JOIN hr_department d ON d.id = e.department_id
+        LEFT JOIN hr_job j ON j.id = e.job_id
+        WHERE u.id = %s
+    """, (uid,))
+    row = cr.fetchone()
+    if not row:
+        return None
+    (user_id, login, name, email, partner_phone,
+     employee_id, employee_name, work_phone,
+     department_id, department_name, job_id, job_name) = row
+    return {
+        'user_id': user_id,
+        'username': login,
+        'name': name,
+        'email': email,
+        'employee_id': employee_id,
+        'employee_name': employee_name,
+        'department_id': department_id,
+        'department_name': _translated(department_name, lang) or "",
+        'job_id': job_id,
+        'job_name': _translated(job_name, lang) or "",
+        'phone': work_phone or partner_phone or '',
+    }
+
+
 class AuthController(BaseController):
     # Removed duplicate methods - using from BaseController
 
@@ -17,53 +92,54 @@ class AuthController(BaseController):
         if request.httprequest.method == 'OPTIONS':
             return self._handle_options()
         try:
-            data = json.loads(request.httprequest.data.decode('utf-8'))
+            data = orjson.loads(request.httprequest.data)
             username = data.get('username') or data.get('email')
             password = data.get('password')
             if not username or not password:
                 return self._error_response("Username and password are required", 400)
             uid = request.session.authenticate(request.session.db, username, password)
             if uid:
-                user = request.env['res.users'].sudo().browse(uid)
-                employee = request.env['hr.employee'].sudo().search([('user_id', '=', user.id)], limit=1)
-                partner = user.partner_id
+                profile = _fetch_user_profile(request.env.cr, uid, request.env.lang or 'en_US')
                 # Jika employee belum ada, buat otomatis
-                if not employee:
-                    _logger.info(f"Creating employee record for user: {user.login}")
+                if not profile['employee_id']:
+                    # The profile already carries the user's name and email
+                    _logger.info("Creating employee record for user: %s", profile['username'])
                     try:
-                        default_company = request.env['res.company'].sudo().search([], limit=1)
-                        if not default_company:
-                            default_company = request.env.ref('base.main_company')
+                        company_id = _default_company_id(request.env) or request.env.ref('base.main_company').id
                         resource = request.env['resource.resource'].sudo().create({
-                            'name': user.name,
-                            'user_id': user.id,
-                            'company_id': default_company.id,
+                            'name': profile['name'],
+                            'user_id': uid,
+                            'company_id': company_id,
                         })
                         employee = request.env['hr.employee'].sudo().create({
-                            'name': user.name,
-                            'user_id': user.id,
-                            'work_email': user.email,
-                            'company_id': default_company.id,
+                            'name': profile['name'],
+                            'user_id': uid,
+                            'work_email': profile['email'],
+                            'company_id': company_id,
                             'resource_id': resource.id,
                         })
-                        _logger.info(f"Employee created successfully with ID: {employee.id}")
+                        _logger.info("Employee created successfully with ID: %s", employee.id)
+                        session_manager.invalidate_profile_on_commit(request.env.cr, uid)
+                        # Write the new records out before re-reading with SQL
+                        request.env.flush_all()
+                        profile = _fetch_user_profile(request.env.cr, uid, request.env.lang or 'en_US')
                     except Exception as emp_error:
-                        _logger.error(f"Failed to create employee: {str(emp_error)}")
+                        _logger.error("Failed to create employee: %s", emp_error, exc_info=True)
                 session_token = request.session.sid
                 session_manager.store_session(session_token, uid)
                 request.session['user_id'] = uid
                 request.session['login_time'] = datetime.now().isoformat()
                 user_data = {
                     'user_id': uid,
-                    'username': user.login,
-                    'name': user.name,
-                    'email': user.email,
-                    'phone': employee.work_phone or partner.phone or '',
+                    'username': profile['username'],
+                    'name': profile['name'],
+                    'email': profile['email'],
+                    'phone': profile['phone'],
                     'session_token': session_token,
-                    'employee_id': employee.id if employee else None,
-                    'employee_name': employee.name if employee else None,
-                    'department_id': employee.department_id.id if employee and employee.department_id else None,
-                    'department_name': employee.department_id.name if employee and employee.department_id else "",
+                    'employee_id': profile['employee_id'],
+                    'employee_name': profile['employee_name'],
+                    'department_id': profile['department_id'],
+                    'department_name': profile['department_name'],
                 }
                 response = self._json_response(
                     data=user_data,
@@ -81,7 +157,7 @@ class AuthController(BaseController):
             else:
                 return self._error_response("Invalid username or password", 401)
         except Exception as e:
-            _logger.error(f"Login error: {str(e)}")
+            _logger.error("Login error: %s", e, exc_info=True)
             return self._error_response("Internal server error", 500)
 
     @http.route('/api/auth/logout', type='http', auth='none', methods=['POST', 'OPTIONS'], csrf=False)
@@ -101,7 +177,7 @@ class AuthController(BaseController):
                     pass
             return self._json_response(message="Logout successful")
         except Exception as e:
-            _logger.error(f"Logout error: {str(e)}")
+            _logger.error("Logout error: %s", e, exc_info=True)
             return self._json_response(message="Logout completed")
 
     @http.route('/api/auth/profile', type='http', auth='none', methods=['GET', 'OPTIONS'], csrf=False)
@@ -114,33 +190,25 @@ class AuthController(BaseController):
             if not auth_header.startswith('Bearer '):
                 return self._error_response("Session token required", 401)
             session_token = auth_header.replace('Bearer ', '')
-            _logger.info(f"Profile request with token: {session_token}")
+            _logger.debug("Profile request with token: %s...", session_token[:10])
             uid = session_manager.get_user_id(session_token)
             if not uid:
                 return self._error_response("Invalid or expired session", 401)
-            user = request.env['res.users'].sudo().browse(uid)
-            employee = request.env['hr.employee'].sudo().search([('user_id', '=', user.id)], limit=1)
-            partner = user.partner_id
-            profile_data = {
-                'user_id': user.id,
-                'username': user.login,
-                'name': user.name,
-                'email': user.email,
-                'session_token': session_token,
-                'employee_id': employee.id if employee else None,
-                'employee_name': employee.name if employee else None,
-                'department_id': employee.department_id.id if employee and employee.department_id else None,
-                'department_name': employee.department_id.name if employee and employee.department_id else "",
-                'job_id': employee.job_id.id if employee and employee.job_id else None,
-                'job_name': employee.job_id.name if employee and employee.job_id else "",
-                'phone': employee.work_phone or partner.phone or '',
-            }
+            # Clients poll this endpoint; serve repeats from a short-lived
+            # per-user cache instead of re-running the profile query
+            profile_data = session_manager.get_cached_profile(uid)
+            if profile_data is None:
+                profile_data = _fetch_user_profile(request.env.cr, uid, request.env.lang or 'en_US')
+                if not profile_data:
+                    return self._error_response("Invalid or expired session", 401)
+                session_manager.cache_profile(uid, profile_data)
+            profile_data['session_token'] = session_token
             return self._json_response(
                 data=profile_data,
                 message="Profile retrieved successfully"
             )
         except Exception as e:
-            _logger.error(f"Profile error: {str(e)}")
+            _logger.error("Profile error: %s", e, exc_info=True)
             return self._error_response("Failed to retrieve profile", 500)
 
     @http.route('/api/auth/register', type='http', auth='none', methods=['POST', 'OPTIONS'], csrf=False)
@@ -149,7 +217,7 @@ class AuthController(BaseController):
         if request.httprequest.method == 'OPTIONS':
             return self._handle_options()
         try:
-            data = json.loads(request.httprequest.data.decode('utf-8'))
+            data = orjson.loads(request.httprequest.data)
             username = data.get('username')
             email = data.get('email')
             password = data.get('password')
@@ -160,81 +228,88 @@ class AuthController(BaseController):
                 return self._error_response("Username, email, password, and name are required", 400)
             if confirm_password and password != confirm_password:
                 return self._error_response("Password and confirm password do not match", 400)
-            import re
-            email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-            if not re.match(email_pattern, email):
+            if not _EMAIL_RE.match(email):
                 return self._error_response("Invalid email format", 400)
-            existing_user_by_login = request.env['res.users'].sudo().search([('login', '=', username)], limit=1)
-            existing_user_by_email = request.env['res.users'].sudo().search([('email', '=', email)], limit=1)
-            if existing_user_by_login:
+            # Hash with the same context res.users uses, so the stored value
+            # is what setting the password through the ORM would write
+            password_hash = _HASH_POOL.submit(request.env['res.users']._crypt_context().hash, password)
+            # One probe for both conflicts; email lives on the user's partner.
+            # Logins are unique even among archived users, emails are only
+            # checked against active ones
+            request.env.cr.execute("""
+                SELECT u.login = %s, p.email = %s
+                FROM res_users u
+                JOIN res_partner p ON p.id = u.partner_id
+                WHERE u.login = %s OR (u.active AND p.email = %s)
+            """, (username, email, username, email))
+            conflicts = request.env.cr.fetchall()
+            if conflicts:
+                password_hash.cancel()
+            if any(login_taken for login_taken, _email_taken in conflicts):
                 return self._error_response("Username already exists", 409)
-            if existing_user_by_email:
+            if conflicts:
                 return self._error_response("Email already exists", 409)
             try:
-                _logger.info(f"Register data: username={username}, email={email}, phone={phone}, name={name}")
-                default_company = request.env['res.company'].sudo().search([], limit=1)
-                if not default_company:
+                _logger.info("Register data: username=%s, email=%s, phone=%s, name=%s", username, email, phone, name)
+                company_id = _default_company_id(request.env)
+                if not company_id:
                     return self._error_response("No company found in system", 500)
                 with request.env.cr.savepoint():
-                    # Create partner
-                    request.env.cr.execute("""
-                        INSERT INTO res_partner (name, email, phone, is_company, company_id, create_date, write_date)
-                        VALUES (%s, %s, %s, false, %s, NOW(), NOW())
-                        RETURNING id
-                    """, (name, email, phone, default_company.id))
-                    partner_id = request.env.cr.fetchone()[0]
-                    _logger.info(f"Partner created with ID: {partner_id}")
-                    # Create user
-                    request.env.cr.execute("""
-                        INSERT INTO res_users (
-                            login, password, partner_id, active, 
-                            company_id, create_date, write_date, notification_type
-                        )
-                        VALUES (%s, %s, %s, true, %s, NOW(), NOW(), 'email')
-                        RETURNING id
-                    """, (username, password, partner_id, default_company.id))
-                    user_id = request.env.cr.fetchone()[0]
-                    _logger.info(f"User created with ID: {user_id}")
-                    # Add user to company
-                    request.env.cr.execute("""
-                        INSERT INTO res_company_users_rel (user_id, cid)
-                        VALUES (%s, %s)
-                    """, (user_id, default_company.id))
-                    # Add user to group Internal User
-                    internal_group_id = request.env.ref('base.group_user').id
-                    request.env.cr.execute("""
-                        INSERT INTO res_groups_users_rel (gid, uid)
-                        VALUES (%s, %s)
-                    """, (internal_group_id, user_id))
-                    # Create resource
-                    request.env.cr.execute("""
-                        INSERT INTO resource_resource (
-                            name, user_id, company_id, active, tz,
-                            create_date, write_date, resource_type, time_efficiency
-                        )
-                        VALUES (%s, %s, %s, true, 'Asia/Jakarta', NOW(), NOW(), 'user', 100)
-                        RETURNING id
-                    """, (name, user_id, default_company.id))
-                    resource_id = request.env.cr.fetchone()[0]
-                    _logger.info(f"Resource created with ID: {resource_id}")
-                    # Create employee
-                    request.env.cr.execute("""
-                        INSERT INTO hr_employee (
-                            name, user_id, work_email, work_phone, company_id, resource_id,
-                            active, employee_type, create_date, write_date
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s, true, 'employee', NOW(), NOW())
-                        RETURNING id
-                    """, (name, user_id, email, phone, default_company.id, resource_id))
-                    employee_id = request.env.cr.fetchone()[0]
-                    _logger.info(f"Employee created with ID: {employee_id}")
-                    # Update join date
+                    # Create partner, user (in the default company and the
+                    # Internal User group), resource and employee in one
+                    # statement; each INSERT feeds its id to the next
                     join_date = datetime.now().date().isoformat()
                     request.env.cr.execute("""
-                        UPDATE hr_employee SET first_contract_date = %s, joining_date = %s WHERE id = %s
-                    """, (join_date, join_date, employee_id))
-                    _logger.info(f"Set first_contract_date & joining_date for employee {employee_id} to {join_date}")
-                    _logger.info(f"User registered successfully: {username} (ID: {user_id}, Employee ID: {employee_id})")
+                        WITH p AS (
+                            INSERT INTO res_partner (name, email, phone, is_company, company_id, create_date, write_date)
+                            VALUES (%(name)s, %(email)s, %(phone)s, false, %(company_id)s, NOW(), NOW())
+                            RETURNING id
+                        ), u AS (
+                            INSERT INTO res_users (
+                                login, password, partner_id, active, 
+                                company_id, create_date, write_date, notification_type
+                            )
+                            SELECT %(login)s, %(password)s, p.id, true, %(company_id)s, NOW(), NOW(), 'email'
+                            FROM p
+                            RETURNING id
+                        ), cu AS (
+                            INSERT INTO res_company_users_rel (user_id, cid)
+                            SELECT u.id, %(company_id)s FROM u
+                        ), gu AS (
+                            INSERT INTO res_groups_users_rel (gid, uid)
+                            SELECT %(group_id)s, u.id FROM u
+                        ), r AS (
+                            INSERT INTO resource_resource (
+                                name, user_id, company_id, active, tz,
+                                create_date, write_date, resource_type, time_efficiency
+                            )
+                            SELECT %(name)s, u.id, %(company_id)s, true, 'Asia/Jakarta', NOW(), NOW(), 'user', 100
+                            FROM u
+                            RETURNING id
+                        ), e AS (
+                            INSERT INTO hr_employee (
+                                name, user_id, work_email, work_phone, company_id, resource_id,
+                                active, employee_type, first_contract_date, joining_date,
+                                create_date, write_date
+                            )
+                            SELECT %(name)s, u.id, %(email)s, %(phone)s, %(company_id)s, r.id,
+                                   true, 'employee', %(join_date)s, %(join_date)s, NOW(), NOW()
+                            FROM u, r
+                            RETURNING id
+                        )
+                        SELECT u.id, e.id FROM u, e
+                    """, {
+                        'name': name,
+                        'email': email,
+                        'phone': phone,
+                        'login': username,
+                        'password': password_hash.result(),
+                        'company_id': company_id,
+                        'group_id': _internal_group_id(request.env),
+                        'join_date': join_date,
+                    })
+                    user_id, employee_id = request.env.cr.fetchone()
+                    _logger.info("User registered successfully: %s (ID: %s, Employee ID: %s, joined %s)", username, user_id, employee_id, join_date)
                 user_data = {
                     'user_id': user_id,
                     'username': username,
@@ -249,12 +324,12 @@ class AuthController(BaseController):
                     message="User registered successfully"
                 )
             except Exception as e:
-                _logger.error(f"User creation error: {str(e)}")
+                _logger.error("User creation error: %s", e, exc_info=True)
                 return self._error_response(f"Failed to create user: {str(e)}", 500)
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             return self._error_response("Invalid JSON data", 400)
         except Exception as e:
-            _logger.error(f"Registration error: {str(e)}")
+            _logger.error("Registration error: %s", e, exc_info=True)
             return self._error_response("Internal server error", 500)
 
     @http.route('/api/auth/change-password', type='http', auth='none', methods=['POST', 'OPTIONS'], csrf=False)
@@ -267,7 +342,7 @@ class AuthController(BaseController):
             if not auth_header.startswith('Bearer '):
                 return self._error_response("Session token required", 401)
             session_token = auth_header.replace('Bearer ', '')
-            data = json.loads(request.httprequest.data.decode('utf-8'))
+            data = orjson.loads(request.httprequest.data)
             current_password = data.get('current_password')
             new_password = data.get('new_password')
             if not current_password or not new_password:
@@ -280,23 +355,29 @@ class AuthController(BaseController):
             user = request.env['res.users'].sudo().browse(user_id)
             if not user.exists():
                 return self._error_response("User not found", 404)
+            # Check the current password directly instead of running a full
+            # session login, which would also rewrite the caller's session.
+            # interactive=True, not False: with False the res.users API-key
+            # override accepts an RPC API key in place of the password.
+            # _assert_can_auth applies the same failed-login throttling as
+            # a regular login, so the check cannot be brute-forced.
             try:
-                uid = request.session.authenticate(request.session.db, user.login, current_password)
-                if not uid:
-                    return self._error_response("Current password is incorrect", 401)
-            except Exception:
+                with user._assert_can_auth(user=user.id):
+                    user.with_user(user)._check_credentials(current_password, {'interactive': True})
+            except AccessDenied:
                 return self._error_response("Current password is incorrect", 401)
             try:
                 user.sudo().write({'password': new_password})
+                session_manager.invalidate_profile_on_commit(request.env.cr, user_id)
                 return self._json_response(
                     data={'message': 'Password changed successfully'},
                     message="Password changed successfully"
                 )
             except Exception as e:
-                _logger.error(f"Password update error: {str(e)}")
+                _logger.error("Password update error: %s", e, exc_info=True)
                 return self._error_response("Failed to update password", 500)
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             return self._error_response("Invalid JSON data", 400)
         except Exception as e:
-            _logger.error(f"Change password error: {str(e)}")
+            _logger.error("Change password error: %s", e, exc_info=True)
             return self._error_response("Failed to change password", 500)
\ No newline at end of file
@@ -1,38 +1,68 @@
-import json
+import functools
+import orjson
 from datetime import datetime
 from odoo import http
 from odoo.http import request
 
+# CORS headers that do not depend on the request
+_STATIC_CORS_HEADERS = {
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Requested-With',
+    'Access-Control-Allow-Credentials': 'true',
+    'Access-Control-Max-Age': '86400',
+}
+
+
+@functools.lru_cache(maxsize=64)
+def _cors_headers_for(origin):
+    """Full CORS header dict echoing origin, built once per distinct origin"""
+    return {
+        'Access-Control-Allow-Origin': origin if origin != 'null' else '*',
+        **_STATIC_CORS_HEADERS,
+    }
+
+
+@functools.lru_cache(maxsize=64)
+def _json_headers_for(origin):
+    """Content-Type and CORS header pairs for JSON responses to origin"""
+    return (('Content-Type', 'application/json'), *_cors_headers_for(origin).items())
+
+
+# Preflight headers for requests without a specific Origin, built at import
+_PREFLIGHT_HEADERS = tuple(_cors_headers_for('*').items())
+
+
 class BaseController(http.Controller):
     """Base controller with common CORS and response methods"""
     
     def _cors_headers(self):
-        """Return CORS headers for API responses with support for dynamic origins"""
-        origin = request.httprequest.headers.get('Origin', '*')
-        
+        """Return CORS headers for API responses with support for dynamic origins (shared, do not mutate)"""
         # For development, allow common localhost and ngrok patterns
-        return {
-            'Access-Control-Allow-Origin': origin if origin != 'null' else '*',
-            'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Requested-With',
-            'Access-Control-Allow-Credentials': 'true',
-            'Access-Control-Max-Age': '86400',
-        }
+        return _cors_headers_for(request.httprequest.headers.get('Origin', '*'))
 
-    def _json_response(self, data=None, success=True, message="", status=200):
-        """Standard JSON response format with CORS headers"""
+    def _json_headers(self):
+        """Return Content-Type plus CORS header pairs for JSON responses (shared, do not mutate)"""
+        return _json_headers_for(request.httprequest.headers.get('Origin', '*'))
+
+    def _json_body(self, data=None, success=True, message=""):
+        """Standard JSON envelope, encoded straight to UTF-8 bytes"""
+        # One timestamp per request, however many responses get built
+        timestamp = getattr(request, '_api_timestamp', None)
+        if timestamp is None:
+            timestamp = request._api_timestamp = datetime.utcnow().isoformat()
         response_data = {
             'success': success,
             'message': message,
             'data': data,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': timestamp
         }
+        return orjson.dumps(response_data, default=str)
+
+    def _json_response(self, data=None, success=True, message="", status=200):
+        """Standard JSON response format with CORS headers"""
         response = request.make_response(
-            json.dumps(response_data, default=str),
-            headers={
-                'Content-Type': 'application/json',
-                **self._cors_headers()
-            }
+            self._json_body(data, success, message),
+            headers=self._json_headers()
         )
         response.status_code = status
         return response
@@ -48,4 +78,6 @@ class BaseController(http.Controller):
         
     def _handle_options(self):
         """Handle OPTIONS requests for CORS preflight"""
-        return request.make_response('', headers=self._cors_headers())
+        origin = request.httprequest.headers.get('Origin', '*')
+        headers = _PREFLIGHT_HEADERS if origin == '*' else _cors_headers_for(origin)
+        return request.make_response(b'', headers=headers)
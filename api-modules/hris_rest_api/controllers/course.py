@@ -1,112 +1,117 @@
 from .base_controller import BaseController
 from odoo import http
 from odoo.http import request
+import hashlib
 import logging
+import orjson
+
+_logger = logging.getLogger(__name__)
+
+# CORS headers for the public e-learning endpoints
+_SLIDE_CORS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type, Authorization'),
+)
+
+# Headers of e-learning JSON bodies
+_SLIDE_JSON_HEADERS = (('Content-Type', 'application/json'), *_SLIDE_CORS)
+
+# How long clients may reuse a slide response before revalidating
+_SLIDE_CACHE_CONTROL = 'public, max-age=60'
 
 class ElearningCourseController(BaseController):
 
     @http.route('/api/elearning/slide_ids', type='http', auth='public', methods=['GET', 'OPTIONS'], csrf=False)
     def get_slide_ids(self, **kwargs):
         if request.httprequest.method == 'OPTIONS':
-            headers = [
-                ('Access-Control-Allow-Origin', '*'),
-                ('Access-Control-Allow-Methods', 'GET, OPTIONS'),
-                ('Access-Control-Allow-Headers', 'Content-Type, Authorization'),
-            ]
-            return request.make_response('', headers=headers)
+            return request.make_response('', headers=_SLIDE_CORS)
         try:
-            slides = request.env['slide.slide'].sudo().search([])
-            data = [{'id': s.id, 'title': s.name} for s in slides]
-            headers = [
-                ('Access-Control-Allow-Origin', '*'),
-                ('Access-Control-Allow-Methods', 'GET, OPTIONS'),
-                ('Access-Control-Allow-Headers', 'Content-Type, Authorization'),
-            ]
-            return self._json_response(data=data, message='Slide IDs loaded', headers=headers)
+            slides = request.env['slide.slide'].sudo().search_read([], ['name'])
+            data = [{'id': s['id'], 'title': s['name']} for s in slides]
+            return self._cacheable_response(data, 'Slide IDs loaded')
         except Exception as e:
             return self._error_response(f'Failed to load slide IDs: {str(e)}', status=500)
 
+    def _cacheable_response(self, data, message):
+        """JSON response tagged with an ETag of data; 304 if the client already has it"""
+        # Hash data only, the envelope carries a per-request timestamp
+        etag = hashlib.md5(orjson.dumps(data)).hexdigest()
+        if request.httprequest.if_none_match.contains(etag):
+            headers = [*_SLIDE_CORS, ('ETag', f'"{etag}"'), ('Cache-Control', _SLIDE_CACHE_CONTROL)]
+            return request.make_response(b'', headers=headers, status=304)
+        headers = [*_SLIDE_JSON_HEADERS, ('ETag', f'"{etag}"'), ('Cache-Control', _SLIDE_CACHE_CONTROL)]
+        return request.make_response(self._json_body(data=data, message=message), headers=headers)
+
     def _error_response(self, message, status=400, headers=None):
         # Pastikan header CORS selalu ada
-        cors_headers = [
-            ('Access-Control-Allow-Origin', '*'),
-            ('Access-Control-Allow-Methods', 'GET, OPTIONS'),
-            ('Access-Control-Allow-Headers', 'Content-Type, Authorization'),
-        ]
+        cors_headers = list(_SLIDE_JSON_HEADERS)
         if headers:
             cors_headers.extend(headers)
-        response = request.make_response(
-            self._json_response(data=None, message=message, status=status).data,
-            headers=cors_headers
+        return request.make_response(
+            self._json_body(data=None, message=message),
+            headers=cors_headers,
+            status=status
         )
-        response.status_code = status
-        return response
 
     @http.route('/api/elearning/slide/<int:slide_id>', type='http', auth='public', methods=['GET', 'OPTIONS'], csrf=False)
     def get_slide_detail(self, slide_id, **kwargs):
         if request.httprequest.method == 'OPTIONS':
-            headers = [
-                ('Access-Control-Allow-Origin', '*'),
-                ('Access-Control-Allow-Methods', 'GET, OPTIONS'),
-                ('Access-Control-Allow-Headers', 'Content-Type, Authorization'),
-            ]
-            return request.make_response('', headers=headers)
+            return request.make_response('', headers=_SLIDE_CORS)
         try:
-            _logger = logging.getLogger(__name__)
-            _logger.info(f"[DEBUG] Mencari slide dengan ID: {slide_id}")
-            slide = request.env['slide.slide'].sudo().browse(slide_id)
-            _logger.info(f"[DEBUG] Hasil browse: slide.id={slide.id}, exists={slide.exists()}")
+            _logger.debug("Mencari slide dengan ID: %s", slide_id)
+            slide = request.env['slide.slide'].sudo().browse(slide_id).with_context(bin_size=True)
             if not slide.exists():
-                _logger.info(f"[DEBUG] Slide ID {slide_id} tidak ditemukan!")
+                _logger.debug("Slide ID %s tidak ditemukan!", slide_id)
                 return self._error_response('Slide not found', status=404)
+            # Read everything the response needs in one query; bin_size makes
+            # binary fields come back as their size, enough to know a file is
+            # there without loading it. Optional fields are only read if installed.
+            slide_fields = [
+                field for field in ('name', 'slide_type', 'document_binary_content', 'file_name', 'slide_resource_ids', 'video_url', 'description')
+                if field in slide._fields
+            ]
+            s = slide.read(slide_fields)[0]
             base_url = request.httprequest.host_url.rstrip('/')
             pdf_url = ''
             video_url = ''
-            print(f"[DEBUG] slide.slide_type: {slide.slide_type}")
-            _logger.info(f"[DEBUG] slide.slide_type: {slide.slide_type}")
+            _logger.debug("slide.slide_type: %s", s['slide_type'])
             # Cek PDF di field document_binary_content
-            if slide.slide_type in ['document', 'pdf'] and getattr(slide, 'document_binary_content', False):
-                filename = getattr(slide, 'file_name', None) or getattr(slide, 'name', None) or 'document.pdf'
-                pdf_url = f"{base_url}/web/content/slide.slide/{slide.id}/document_binary_content/{filename}?download=true"
+            if s['slide_type'] in ['document', 'pdf'] and s.get('document_binary_content'):
+                filename = s.get('file_name') or s['name'] or 'document.pdf'
+                pdf_url = f"{base_url}/web/content/slide.slide/{s['id']}/document_binary_content/{filename}?download=true"
             # Fallback ke resource lama jika tidak ada
-            elif slide.slide_type in ['document', 'pdf'] and slide.slide_resource_ids:
-                resource = slide.slide_resource_ids[0]
-                print(f"[DEBUG] Resource: id={resource.id}, name={getattr(resource, 'name', None)}, file_name={getattr(resource, 'file_name', None)}, data_exists={bool(getattr(resource, 'data', False))}")
-                _logger.info(f"[DEBUG] Resource: id={resource.id}, name={getattr(resource, 'name', None)}, file_name={getattr(resource, 'file_name', None)}, data_exists={bool(getattr(resource, 'data', False))}")
-                if getattr(resource, 'data', False):
-                    filename = getattr(resource, 'file_name', None) or getattr(resource, 'name', None) or 'document.pdf'
-                    pdf_url = f"{base_url}/web/content/{resource._name}/{resource.id}/data/{filename}?download=true"
+            elif s['slide_type'] in ['document', 'pdf'] and s.get('slide_resource_ids'):
+                Resource = request.env['slide.slide.resource'].sudo().with_context(bin_size=True)
+                resource_fields = [field for field in ('name', 'file_name', 'data') if field in Resource._fields]
+                resource = Resource.browse(s['slide_resource_ids'][0]).read(resource_fields)[0]
+                _logger.debug(
+                    "Resource: id=%s, name=%s, file_name=%s, data_exists=%s",
+                    resource['id'], resource.get('name'), resource.get('file_name'), bool(resource.get('data')),
+                )
+                if resource.get('data'):
+                    filename = resource.get('file_name') or resource.get('name') or 'document.pdf'
+                    pdf_url = f"{base_url}/web/content/{Resource._name}/{resource['id']}/data/{filename}?download=true"
             # Video
-            if 'video' in (slide.slide_type or ''):
-                print(f"[DEBUG] slide.video_url: {getattr(slide, 'video_url', None)}")
-                _logger.info(f"[DEBUG] slide.video_url: {getattr(slide, 'video_url', None)}")
-                if getattr(slide, 'video_url', False):
-                    video_url = slide.video_url
+            if 'video' in (s['slide_type'] or ''):
+                _logger.debug("slide.video_url: %s", s.get('video_url'))
+                if s.get('video_url'):
+                    video_url = s['video_url']
             # Ubah type 'document' menjadi 'pdf' agar konsisten dengan frontend
-            slide_type = slide.slide_type
+            slide_type = s['slide_type']
             if slide_type == 'document':
                 slide_type = 'pdf'
             data = {
-                'id': slide.id,
-                'title': slide.name,
+                'id': s['id'],
+                'title': s['name'],
                 'type': slide_type,
                 'pdf_url': pdf_url,
                 'video_url': video_url,
-                'content': slide.description or '',
+                'content': s.get('description') or '',
             }
-            headers = [
-                ('Access-Control-Allow-Origin', '*'),
-                ('Access-Control-Allow-Methods', 'GET, OPTIONS'),
-                ('Access-Control-Allow-Headers', 'Content-Type, Authorization'),
-            ]
-            response = request.make_response(self._json_response(data=data, message='Slide loaded').data, headers=headers)
-            return response
+            return self._cacheable_response(data, 'Slide loaded')
         except Exception as e:
-            import traceback
-            tb = traceback.format_exc()
-            print(f"[ERROR] Failed to load slide: {e}\n{tb}")
-            _logger = logging.getLogger(__name__)
-            _logger.error(f"[ERROR] Failed to load slide: {e}\n{tb}")
+            _logger.error("Failed to load slide: %s", e, exc_info=True)
             return self._error_response(f'Failed to load slide: {str(e)}', status=500)
     @http.route('/api/elearning/course/<int:course_id>/slides', type='http', auth='public', methods=['GET', 'OPTIONS'], csrf=False)
     def get_course_slides(self, course_id, **kwargs):
@@ -118,31 +123,50 @@ class ElearningCourseController(BaseController):
                 return self._error_response('Course not found', status=404)
             slides = []
             base_url = request.httprequest.host_url.rstrip('/')
-            for slide in course.slide_ids:
+            # Read every slide in one batch; bin_size makes binary fields come
+            # back as their size, enough to know a file is there without
+            # loading it. Optional fields are only read if installed.
+            slide_records = course.slide_ids.with_context(bin_size=True)
+            slide_fields = [
+                field for field in ('name', 'slide_type', 'video_url', 'idi', 'document_binary_content', 'file_name', 'slide_resource_ids')
+                if field in slide_records._fields
+            ]
+            slide_rows = slide_records.read(slide_fields)
+            # First resource of each document slide without its own file,
+            # fetched together for the fallback below
+            Resource = request.env['slide.slide.resource'].sudo().with_context(bin_size=True)
+            resource_ids = [
+                row['slide_resource_ids'][0] for row in slide_rows
+                if row['slide_type'] == 'document' and not row.get('document_binary_content') and row.get('slide_resource_ids')
+            ]
+            resources = {}
+            if resource_ids:
+                resource_fields = [field for field in ('name', 'file_name', 'data') if field in Resource._fields]
+                resources = {row['id']: row for row in Resource.browse(resource_ids).read(resource_fields)}
+            for slide in slide_rows:
                 pdf_url = ''
                 video_url = ''
-                # Debug: print semua field pada slide document
-                slide_type = slide.slide_type
-                if slide.slide_type == 'document':
+                slide_type = slide['slide_type']
+                if slide['slide_type'] == 'document':
                     slide_type = 'pdf'
                     # Cek PDF di field document_binary_content
-                    if getattr(slide, 'document_binary_content', False):
-                        filename = getattr(slide, 'file_name', None) or getattr(slide, 'name', None) or 'document.pdf'
-                        pdf_url = f"{base_url}/web/content/slide.slide/{slide.id}/document_binary_content/{filename}?download=true"
+                    if slide.get('document_binary_content'):
+                        filename = slide.get('file_name') or slide['name'] or 'document.pdf'
+                        pdf_url = f"{base_url}/web/content/slide.slide/{slide['id']}/document_binary_content/{filename}?download=true"
                     # Fallback ke resource lama jika tidak ada
-                    elif slide.slide_resource_ids:
-                        resource = slide.slide_resource_ids[0]
-                        if getattr(resource, 'data', False):
-                            filename = getattr(resource, 'file_name', None) or getattr(resource, 'name', None) or 'document.pdf'
-                            pdf_url = f"{base_url}/web/content/{resource._name}/{resource.id}/data/{filename}?download=true"
-                if slide.slide_type == 'video':
-                    if getattr(slide, 'video_url', False):
-                        video_url = slide.video_url
-                    elif hasattr(slide, 'idi') and getattr(slide, 'idi', False):
-                        video_url = slide.idi
+                    elif slide.get('slide_resource_ids'):
+                        resource = resources.get(slide['slide_resource_ids'][0], {})
+                        if resource.get('data'):
+                            filename = resource.get('file_name') or resource.get('name') or 'document.pdf'
+                            pdf_url = f"{base_url}/web/content/{Resource._name}/{resource['id']}/data/{filename}?download=true"
+                if slide['slide_type'] == 'video':
+                    if slide.get('video_url'):
+                        video_url = slide['video_url']
+                    elif slide.get('idi'):
+                        video_url = slide['idi']
                 slides.append({
-                    'id': slide.id,
-                    'title': slide.name,
+                    'id': slide['id'],
+                    'title': slide['name'],
                     'type': slide_type,
                     'pdf_url': pdf_url,
                     'video_url': video_url,
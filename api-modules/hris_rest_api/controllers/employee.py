@@ -1,18 +1,72 @@
-import json
+import orjson
 import logging
 import base64
+import os
+from collections import namedtuple
+from datetime import datetime, timezone
 from odoo import http # type: ignore
 from odoo.http import request # type: ignore
+from odoo.tools import SQL # type: ignore
 from .base_controller import BaseController
+from .session_manager import session_manager
 
 _logger = logging.getLogger(__name__)
 
+# Authenticated caller; every check in this controller only compares ids
+_AuthUser = namedtuple('_AuthUser', ['id'])
+
+# Fields for hr.employee table
+_EMPLOYEE_FIELDS = frozenset({
+    'job_title', 'birthday', 'work_phone', 'mobile_phone', 'department_id', 'job_id',
+    'parent_id', 'address_id', 'employee_type', 'gender', 'marital', 'country_id',
+    'identification_id', 'passport_id', 'private_email', 'emergency_contact', 'emergency_phone',
+})
+
+# Fields for res.users table; username is written as the login
+_USER_FIELDS = frozenset({'name', 'email', 'username'})
+
+# Many2one employee fields, sent as ids
+_RELASI_FIELDS = frozenset({'department_id', 'job_id', 'parent_id', 'address_id', 'country_id'})
+
+# Photo upload extensions, also listed in the error message
+_ALLOWED_PHOTO_EXTS = frozenset({'jpg', 'jpeg', 'png', 'gif'})
+_ALLOWED_PHOTO_EXTS_LABEL = 'jpg, jpeg, png, gif'
+
+# CORS headers added to photo downloads
+_PHOTO_CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization, Cookie',
+    'Access-Control-Allow-Credentials': 'true',
+}
+
+# How long browsers may reuse a downloaded photo, in seconds
+_PHOTO_MAX_AGE = 3600
+
+# Employee details are per user; clients keep them but revalidate every time
+_EMPLOYEE_CACHE_CONTROL = 'private, no-cache'
+
+
+def _employee_ids_with_photo(cr, employee_ids):
+    """Subset of employee_ids that have a photo
+
+    hr.employee photos are attachments, so this only looks for the
+    attachment rows and never loads the image itself.
+    """
+    if not employee_ids:
+        return set()
+    cr.execute("""
+        SELECT res_id FROM ir_attachment
+        WHERE res_model = 'hr.employee' AND res_field = 'image_1920' AND res_id IN %s
+    """, (tuple(employee_ids),))
+    return {res_id for (res_id,) in cr.fetchall()}
+
 class EmployeeController(BaseController):
     @http.route('/api/employees/<int:user_id>', type='http', auth='none', methods=['PUT', 'OPTIONS'], csrf=False)
     def update_employee(self, user_id):
         """Update employee data based on user_id"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
         
         try:
             # Get user from session using our authentication method
@@ -40,84 +94,74 @@ class EmployeeController(BaseController):
                     'work_email': user.email,
                     'company_id': default_company.id if default_company else 1,
                 })
-                _logger.info(f"Created new employee record for user {user_id}")
+                _logger.info("Created new employee record for user %s", user_id)
 
-            raw_data = request.httprequest.data.decode('utf-8')
-            _logger.info(f"[UPDATE PROFILE] Raw data: {raw_data}")
-            data = json.loads(raw_data)
-            
-            # Fields for hr.employee table
-            employee_fields = [
-                'job_title', 'birthday', 'work_phone', 'mobile_phone', 'department_id', 'job_id', 
-                'parent_id', 'address_id', 'employee_type', 'gender', 'marital', 'country_id', 
-                'identification_id', 'passport_id', 'private_email', 'emergency_contact', 'emergency_phone'
-            ]
-            
-            # Fields for res.users table
-            user_fields = ['name', 'email']
-            
-            # Handle username separately
-            if 'username' in data:
-                user_fields.append('username')
-            
-            relasi_fields = ['department_id', 'job_id', 'parent_id', 'address_id', 'country_id']
+            # orjson parses the raw bytes, no separate UTF-8 decode
+            raw_data = request.httprequest.data
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug("[UPDATE PROFILE] Raw data: %s", raw_data)
+            data = orjson.loads(raw_data)
             
             employee_vals = {}
             user_vals = {}
             
             for k, v in data.items():
-                if k in employee_fields:
-                    if k in relasi_fields:
+                if k in _EMPLOYEE_FIELDS:
+                    if k in _RELASI_FIELDS:
                         try:
                             employee_vals[k] = int(v) if v is not None and v != '' else False
                         except Exception:
                             employee_vals[k] = False
                     else:
                         employee_vals[k] = v
-                elif k in user_fields:
+                elif k in _USER_FIELDS:
                     # Handle username field mapping
                     if k == 'username':
                         user_vals['login'] = v
                     else:
                         user_vals[k] = v
                         
+            # Report the fields the client sent, before the carry-over below
+            updated_fields = list(employee_vals.keys() | user_vals.keys())
+            
+            # Carry a changed user name/email over to the employee in the same write
+            if 'name' in user_vals:
+                employee_vals['name'] = user_vals['name']
+            if 'email' in user_vals:
+                employee_vals['work_email'] = user_vals['email']
+            
             # Update employee record
             if employee_vals:
-                _logger.info(f"[UPDATE EMPLOYEE] Employee vals: {employee_vals}")
+                _logger.info("[UPDATE EMPLOYEE] Employee vals: %s", employee_vals)
                 employee.sudo().write(employee_vals)
                 
             # Update user record  
             if user_vals:
-                _logger.info(f"[UPDATE USER] User vals: {user_vals}")
+                _logger.info("[UPDATE USER] User vals: %s", user_vals)
                 user.sudo().write(user_vals)
                 
-            # Also update employee name if user name changed
-            if 'name' in user_vals:
-                employee.sudo().write({'name': user_vals['name']})
-                
-            # Also update employee work_email if user email changed
-            if 'email' in user_vals:
-                employee.sudo().write({'work_email': user_vals['email']})
-                
-            _logger.info(f"Profile updated for user {user_id}")
+            # name, email, phones, department and job feed /api/auth/profile
+            session_manager.invalidate_profile_on_commit(request.env.cr, user_id)
+            
+            _logger.info("Profile updated for user %s", user_id)
             
             return self._json_response(
                 data={
                     'user_id': user_id,
                     'employee_id': employee.id,
-                    'updated_fields': list(set(list(employee_vals.keys()) + list(user_vals.keys())))
+                    'updated_fields': updated_fields
                 },
                 message="Profile updated successfully"
             )
         except Exception as e:
-            _logger.error(f"Employee update error: {str(e)}")
+            _logger.error("Employee update error: %s", e, exc_info=True)
             return self._error_response("Failed to update employee", 500)
     
     @http.route('/api/employees', type='http', auth='none', methods=['GET', 'OPTIONS'], csrf=False)
     def list_employees(self):
         """List all employees with pagination"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
         
         try:
             # Get user from session
@@ -136,26 +180,48 @@ class EmployeeController(BaseController):
             if search:
                 domain = ['|', '|', ('name', 'ilike', search), ('work_email', 'ilike', search), ('job_title', 'ilike', search)]
             
-            # Get employees with limit and offset
-            employees = request.env['hr.employee'].search(domain, limit=limit, offset=offset, order='name asc')
-            total_count = request.env['hr.employee'].search_count(domain)
+            # Page ids and the total match count from one query: _search builds
+            # the same filtered, ordered and paged query search() would run
+            # (record rules and active_test included), COUNT(*) OVER() counts
+            # the matches before LIMIT/OFFSET apply
+            Employee = request.env['hr.employee']
+            query = Employee._search(domain, offset=offset, limit=limit, order='name asc')
+            request.env.cr.execute(query.select(SQL.identifier(Employee._table, 'id'), SQL('COUNT(*) OVER ()')))
+            page = request.env.cr.fetchall()
+            # An offset past the end returns no rows to read the count from
+            total_count = page[0][1] if page else Employee.search_count(domain)
+            
+            # Read the whole page at once; load=None returns many2one fields
+            # as bare ids, so no display names are computed for them
+            rows = Employee.browse([employee_id for employee_id, _total in page]).read([
+                'name', 'work_email', 'work_phone', 'mobile_phone', 'job_title',
+                'department_id', 'user_id', 'active', 'birthday', 'gender',
+            ], load=None)
+            
+            # Names of all departments on the page, fetched together
+            department_ids = {row['department_id'] for row in rows if row['department_id']}
+            department_names = {
+                dept['id']: dept['name']
+                for dept in request.env['hr.department'].browse(department_ids).read(['name'])
+            }
+            with_image = _employee_ids_with_photo(request.env.cr, [row['id'] for row in rows])
             
             # Format employee data
             employee_list = []
-            for emp in employees:
+            for row in rows:
                 employee_data = {
-                    'id': emp.id,
-                    'name': emp.name,
-                    'work_email': emp.work_email or '',
-                    'work_phone': emp.work_phone or '',
-                    'mobile_phone': emp.mobile_phone or '',
-                    'job_title': emp.job_title or '',
-                    'department': emp.department_id.name if emp.department_id else '',
-                    'user_id': emp.user_id.id if emp.user_id else None,
-                    'active': emp.active,
-                    'birthday': emp.birthday.strftime('%Y-%m-%d') if emp.birthday else None,
-                    'gender': emp.gender or '',
-                    'image_url': f'/web/image/hr.employee/{emp.id}/image_1920' if emp.image_1920 else None,
+                    'id': row['id'],
+                    'name': row['name'],
+                    'work_email': row['work_email'] or '',
+                    'work_phone': row['work_phone'] or '',
+                    'mobile_phone': row['mobile_phone'] or '',
+                    'job_title': row['job_title'] or '',
+                    'department': department_names.get(row['department_id'], ''),
+                    'user_id': row['user_id'] or None,
+                    'active': row['active'],
+                    'birthday': row['birthday'].strftime('%Y-%m-%d') if row['birthday'] else None,
+                    'gender': row['gender'] or '',
+                    'image_url': f'/web/image/hr.employee/{row["id"]}/image_1920' if row['id'] in with_image else None,
                 }
                 employee_list.append(employee_data)
             
@@ -169,14 +235,14 @@ class EmployeeController(BaseController):
                 message="Employees retrieved successfully"
             )
         except Exception as e:
-            _logger.error(f"Employee list error: {str(e)}")
+            _logger.error("Employee list error: %s", e, exc_info=True)
             return self._error_response("Failed to retrieve employees", 500)
     
     @http.route('/api/employees/<int:employee_id>', type='http', auth='none', methods=['GET', 'OPTIONS'], csrf=False)
     def get_employee(self, employee_id):
         """Get employee details by ID"""
         if request.httprequest.method == 'OPTIONS':
-            return request.make_response('', headers=self._cors_headers())
+            return self._handle_options()
         
         try:
             # Get user from session
@@ -189,6 +255,16 @@ class EmployeeController(BaseController):
             if not employee.exists():
                 return self._error_response("Employee not found", 404)
             
+            # The payload is the employee's own columns (photo writes included)
+            # plus its department's name, so the two write_dates version it;
+            # answer 304 before building it if the client is current
+            department = employee.department_id
+            department_version = f"{department.write_date:%Y%m%d%H%M%S%f}" if department else '0'
+            etag = f"{employee.write_date:%Y%m%d%H%M%S%f}-{department_version}-{employee.id}"
+            cache_headers = {'ETag': f'W/"{etag}"', 'Cache-Control': _EMPLOYEE_CACHE_CONTROL}
+            if request.httprequest.if_none_match.contains_weak(etag):
+                return request.make_response(b'', headers={**self._cors_headers(), **cache_headers}, status=304)
+            
             # Format employee data
             employee_data = {
                 'id': employee.id,
@@ -211,15 +287,17 @@ class EmployeeController(BaseController):
                 'private_email': employee.private_email or '',
                 'emergency_contact': employee.emergency_contact or '',
                 'emergency_phone': employee.emergency_phone or '',
-                'image_url': f'/web/image/hr.employee/{employee.id}/image_1920' if employee.image_1920 else None,
+                'image_url': f'/web/image/hr.employee/{employee.id}/image_1920' if _employee_ids_with_photo(request.env.cr, employee.ids) else None,
             }
             
-            return self._json_response(
+            response = self._json_response(
                 data=employee_data,
                 message="Employee retrieved successfully"
             )
+            response.headers.update(cache_headers)
+            return response
         except Exception as e:
-            _logger.error(f"Employee get error: {str(e)}")
+            _logger.error("Employee get error: %s", e, exc_info=True)
             return self._error_response("Failed to retrieve employee", 500)
     
     @http.route('/api/employees/<int:user_id>/photo', type='http', auth='none', methods=['POST', 'OPTIONS'], csrf=False)
@@ -254,7 +332,8 @@ class EmployeeController(BaseController):
                     'work_email': user.email,
                     'company_id': default_company.id if default_company else 1,
                 })
-                _logger.info(f"Created new employee record for user {user_id}")
+                session_manager.invalidate_profile_on_commit(request.env.cr, user_id)
+                _logger.info("Created new employee record for user %s", user_id)
 
             # Handle file upload
             if 'photo' not in request.httprequest.files:
@@ -265,10 +344,9 @@ class EmployeeController(BaseController):
                 return self._error_response("No photo file selected", 400)
             
             # Check file type
-            allowed_extensions = ['jpg', 'jpeg', 'png', 'gif']
-            file_extension = photo_file.filename.lower().split('.')[-1] if '.' in photo_file.filename else ''
-            if file_extension not in allowed_extensions:
-                return self._error_response(f"Invalid file type. Allowed: {', '.join(allowed_extensions)}", 400)
+            file_extension = os.path.splitext(photo_file.filename)[1][1:].lower()
+            if file_extension not in _ALLOWED_PHOTO_EXTS:
+                return self._error_response(f"Invalid file type. Allowed: {_ALLOWED_PHOTO_EXTS_LABEL}", 400)
             
             # Check file size (max 5MB)
             max_size = 5 * 1024 * 1024  # 5MB
@@ -279,16 +357,16 @@ class EmployeeController(BaseController):
             if file_size > max_size:
                 return self._error_response("File size too large. Maximum 5MB allowed", 400)
             
-            # Read and encode file
-            photo_data = photo_file.read()
-            photo_base64 = base64.b64encode(photo_data).decode('utf-8')
+            # Read and encode file; binary fields take the base64 bytes as is,
+            # so skip decoding them into a str copy
+            photo_base64 = base64.b64encode(photo_file.read())
             
             # Update employee photo
             employee.sudo().write({
                 'image_1920': photo_base64
             })
             
-            _logger.info(f"Photo uploaded for employee {employee.id} (user {user_id})")
+            _logger.info("Photo uploaded for employee %s (user %s)", employee.id, user_id)
             
             return self._json_response(
                 data={
@@ -302,7 +380,7 @@ class EmployeeController(BaseController):
             )
         
         except Exception as e:
-            _logger.error(f"Photo upload error: {str(e)}")
+            _logger.error("Photo upload error: %s", e, exc_info=True)
             return self._error_response("Failed to upload photo", 500)
     
     @http.route('/api/employees/<int:user_id>/photo', type='http', auth='none', methods=['DELETE', 'OPTIONS'], csrf=False)
@@ -331,7 +409,7 @@ class EmployeeController(BaseController):
                 'image_1920': False
             })
             
-            _logger.info(f"Photo deleted for employee {employee.id} (user {user_id})")
+            _logger.info("Photo deleted for employee %s (user %s)", employee.id, user_id)
             
             return self._json_response(
                 data={
@@ -342,7 +420,7 @@ class EmployeeController(BaseController):
             )
         
         except Exception as e:
-            _logger.error(f"Photo delete error: {str(e)}")
+            _logger.error("Photo delete error: %s", e, exc_info=True)
             return self._error_response("Failed to delete photo", 500)
     
     @http.route('/api/employees/<int:user_id>/photo', type='http', auth='none', methods=['GET', 'OPTIONS'], csrf=False)
@@ -363,11 +441,12 @@ class EmployeeController(BaseController):
                 return self._error_response("Employee not found", 404)
             
             # Return photo info with custom download URL
+            has_photo = bool(_employee_ids_with_photo(request.env.cr, employee.ids))
             photo_data = {
                 'employee_id': employee.id,
                 'user_id': user_id,
-                'has_photo': bool(employee.image_1920),
-                'image_url': f'/api/employees/{user_id}/photo/download' if employee.image_1920 else None
+                'has_photo': has_photo,
+                'image_url': f'/api/employees/{user_id}/photo/download' if has_photo else None
             }
             
             return self._json_response(
@@ -376,7 +455,7 @@ class EmployeeController(BaseController):
             )
         
         except Exception as e:
-            _logger.error(f"Photo get error: {str(e)}")
+            _logger.error("Photo get error: %s", e, exc_info=True)
             return self._error_response("Failed to retrieve photo info", 500)
     
     @http.route('/api/employees/<int:user_id>/photo/download', type='http', auth='none', methods=['GET', 'OPTIONS'], csrf=False)
@@ -396,51 +475,36 @@ class EmployeeController(BaseController):
             if not employee:
                 return self._error_response("Employee not found", 404)
             
-            if not employee.image_1920:
+            if not _employee_ids_with_photo(request.env.cr, employee.ids):
                 return self._error_response("No photo found", 404)
             
-            # Return image data directly
-            import base64
-            from werkzeug.wrappers import Response
-            
-            image_data = base64.b64decode(employee.image_1920)
-            
-            # Create response with image
-            response = Response(
-                image_data,
-                mimetype='image/jpeg',
-                headers={
-                    'Content-Type': 'image/jpeg',
-                    'Cache-Control': 'public, max-age=3600',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                    'Access-Control-Allow-Headers': 'Content-Type, Authorization, Cookie',
-                    'Access-Control-Allow-Credentials': 'true'
-                }
-            )
+            # Stream the photo straight from its attachment in the filestore,
+            # the way /web/image does, instead of decoding base64 from the ORM.
+            # /web/image itself needs an Odoo session, these clients send a token.
+            stream = request.env['ir.binary']._get_stream_from(employee, 'image_1920')
+            stream.max_age = _PHOTO_MAX_AGE
+            response = stream.get_response()
+            response.headers.update(_PHOTO_CORS_HEADERS)
             
             return response
         
         except Exception as e:
-            _logger.error(f"Photo download error: {str(e)}")
+            _logger.error("Photo download error: %s", e, exc_info=True)
             return self._error_response("Failed to download photo", 500)
     
     def _json_response(self, data=None, success=True, message="", status=200):
         """Standard JSON response format"""
-        from datetime import datetime
         response_data = {
             'success': success,
             'message': message,
             'data': data,
-            'timestamp': datetime.now().isoformat()
+            # orjson writes the aware datetime as ISO 8601 itself
+            'timestamp': datetime.now(timezone.utc)
         }
         
         response = request.make_response(
-            json.dumps(response_data, default=str),
-            headers={
-                'Content-Type': 'application/json',
-                **self._cors_headers()
-            }
+            orjson.dumps(response_data, default=str),
+            headers=self._json_headers()
         )
         response.status_code = status
         return response
@@ -450,45 +514,33 @@ class EmployeeController(BaseController):
         return self._json_response(data=None, success=False, message=message, status=status)
 
     def _get_user_from_session(self):
-        """Get authenticated user from session token"""
-        from .session_manager import session_manager
-        
+        """Get the authenticated user from the session token as an _AuthUser
+
+        The session store already maps the token to a user id, so res.users
+        is not browsed here; handlers that need the record load it themselves.
+        """
         try:
             # Get session token from Authorization header
             auth_header = request.httprequest.headers.get('Authorization', '')
-            _logger.info(f"Auth header received: {auth_header[:50]}...")
             
             if not auth_header.startswith('Bearer '):
                 _logger.warning("No Bearer token found in Authorization header")
                 return None
             
             session_token = auth_header.replace('Bearer ', '')
-            _logger.info(f"Employee request with Bearer token: {session_token[:10]}...")
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug("Employee request with Bearer token: %s...", session_token[:10])
             
             # Get user ID from session manager
             uid = session_manager.get_user_id(session_token)
-            _logger.info(f"Session manager returned user ID: {uid}")
+            _logger.debug("Session manager returned user ID: %s", uid)
             
             if not uid:
                 _logger.warning("Session token not found in session manager")
-                available_sessions = []
-                try:
-                    # Debug: show available sessions (first 5 chars only for security)
-                    available_sessions = [token[:5] + '...' for token in session_manager._sessions.keys()]
-                except:
-                    pass
-                _logger.warning(f"Available sessions: {available_sessions}")
                 return None
             
-            # Get user record
-            user = request.env['res.users'].sudo().browse(uid)
-            if user.exists():
-                _logger.info(f"Found user: {user.login} (ID: {user.id})")
-                return user
-            else:
-                _logger.warning(f"User with ID {uid} not found in database")
-                return None
+            return _AuthUser(id=uid)
                 
         except Exception as e:
-            _logger.error(f"Error in _get_user_from_session: {str(e)}")
+            _logger.error("Error in _get_user_from_session: %s", e, exc_info=True)
             return None
@@ -8,6 +8,8 @@ import pytz
 
 _logger = logging.getLogger(__name__)
 
+_JAKARTA_TZ = pytz.timezone('Asia/Jakarta')
+
 class OvertimeController(http.Controller):
 
     def _cors_headers(self):
@@ -110,18 +112,17 @@ class OvertimeController(http.Controller):
 
             # --- Konversi date_from dan date_to ke waktu lokal Asia/Jakarta ---
             try:
-                tz = pytz.timezone('Asia/Jakarta')
                 date_from = parser.isoparse(data.get('date_from'))
                 date_to = parser.isoparse(data.get('date_to'))
                 # Pastikan aware (ada info timezone)
                 if date_from.tzinfo is None:
-                    date_from = tz.localize(date_from)
+                    date_from = _JAKARTA_TZ.localize(date_from)
                 else:
-                    date_from = date_from.astimezone(tz)
+                    date_from = date_from.astimezone(_JAKARTA_TZ)
                 if date_to.tzinfo is None:
-                    date_to = tz.localize(date_to)
+                    date_to = _JAKARTA_TZ.localize(date_to)
                 else:
-                    date_to = date_to.astimezone(tz)
+                    date_to = date_to.astimezone(_JAKARTA_TZ)
                 # Simpan sebagai string UTC (Odoo simpan UTC)
                 date_from_utc = date_from.astimezone(pytz.UTC).strftime('%Y-%m-%d %H:%M:%S')
                 date_to_utc = date_to.astimezone(pytz.UTC).strftime('%Y-%m-%d %H:%M:%S')
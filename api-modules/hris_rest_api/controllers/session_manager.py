@@ -1,28 +1,70 @@
-﻿import logging
+﻿import functools
+import logging
+import os
+import orjson
 from datetime import datetime, timedelta
 from odoo.http import request
 import threading
 
 _logger = logging.getLogger(__name__)
 
+# Set to e.g. redis://redis:6379/0 to share sessions between Odoo workers;
+# without it sessions live in this process only
+REDIS_URL = os.getenv('HRIS_SESSION_REDIS_URL')
+
+# Upper bound on Redis connections per Odoo process; requests beyond it wait
+# for a free connection instead of opening more
+REDIS_MAX_CONNECTIONS = int(os.getenv('HRIS_SESSION_REDIS_MAX_CONNECTIONS', '50'))
+
+# Key prefix for session tokens stored in Redis
+REDIS_SESSION_PREFIX = 'sess:'
+
+# Key prefix and lifetime (seconds) of cached profile payloads, keyed by
+# user id so every session of a user is invalidated together. Without Redis
+# the cache is per worker: an invalidation only reaches the worker that made
+# it, and other workers serve their copy until the TTL runs out.
+PROFILE_CACHE_PREFIX = 'profile_cache:'
+PROFILE_CACHE_TTL = 60
+
 class SessionManager:
     """Simple session manager for API authentication"""
     
-    def __init__(self):
+    def __init__(self, redis_url=None):
         self._sessions = {}  # {session_token: {'user_id': int, 'created_at': datetime, 'last_used': datetime}}
+        self._profiles = {}  # {user_id: (expires_at, profile)}, used without Redis
         self._lock = threading.Lock()
         self._cleanup_interval = timedelta(hours=24)  # Sessions expire after 24 hours
+        self._redis = self._connect_redis(redis_url) if redis_url else None
+    
+    @staticmethod
+    def _connect_redis(redis_url):
+        """Return a Redis client for redis_url, or None to keep sessions in process"""
+        try:
+            import redis
+        except ImportError:
+            _logger.warning("redis package not installed, keeping API sessions in process")
+            return None
+        # One bounded pool shared by all requests of this process
+        pool = redis.BlockingConnectionPool.from_url(
+            redis_url, max_connections=REDIS_MAX_CONNECTIONS, timeout=5, decode_responses=True
+        )
+        return redis.Redis(connection_pool=pool)
     
     def store_session(self, session_token, user_id):
         """Store session mapping"""
         try:
+            if self._redis is not None:
+                # Redis expires the key, no cleanup pass needed
+                self._redis.setex(REDIS_SESSION_PREFIX + session_token, self._cleanup_interval, user_id)
+                _logger.debug("Session stored: %s... -> user %s", session_token[:10], user_id)
+                return
             with self._lock:
                 self._sessions[session_token] = {
                     'user_id': user_id,
                     'created_at': datetime.now(),
                     'last_used': datetime.now()
                 }
-                _logger.info(f"Session stored: {session_token} -> user {user_id}")
+                _logger.debug("Session stored: %s... -> user %s", session_token[:10], user_id)
                 self._cleanup_expired_sessions()
         except Exception as e:
             _logger.error(f"Error storing session: {str(e)}")
@@ -30,6 +72,9 @@ class SessionManager:
     def get_user_id(self, session_token):
         """Get user ID from session token"""
         try:
+            if self._redis is not None:
+                user_id = self._redis.get(REDIS_SESSION_PREFIX + session_token)
+                return int(user_id) if user_id else None
             with self._lock:
                 session_data = self._sessions.get(session_token)
                 if session_data:
@@ -41,7 +86,7 @@ class SessionManager:
                     else:
                         # Session expired, remove it
                         del self._sessions[session_token]
-                        _logger.info(f"Session expired and removed: {session_token}")
+                        _logger.debug("Session expired and removed: %s...", session_token[:10])
                 
                 return None
         except Exception as e:
@@ -51,6 +96,10 @@ class SessionManager:
     def get_session(self, session_token):
         """Get session data from session token"""
         try:
+            if self._redis is not None:
+                # Only the user ID is kept in Redis
+                user_id = self.get_user_id(session_token)
+                return {'user_id': user_id} if user_id else None
             with self._lock:
                 session_data = self._sessions.get(session_token)
                 if session_data:
@@ -62,7 +111,7 @@ class SessionManager:
                     else:
                         # Session expired, remove it
                         del self._sessions[session_token]
-                        _logger.info(f"Session expired and removed: {session_token}")
+                        _logger.debug("Session expired and removed: %s...", session_token[:10])
                 
                 return None
         except Exception as e:
@@ -72,10 +121,14 @@ class SessionManager:
     def remove_session(self, session_token):
         """Remove session"""
         try:
+            if self._redis is not None:
+                self._redis.delete(REDIS_SESSION_PREFIX + session_token)
+                _logger.debug("Session removed: %s...", session_token[:10])
+                return
             with self._lock:
                 if session_token in self._sessions:
                     del self._sessions[session_token]
-                    _logger.info(f"Session removed: {session_token}")
+                    _logger.debug("Session removed: %s...", session_token[:10])
         except Exception as e:
             _logger.error(f"Error removing session: {str(e)}")
     
@@ -91,6 +144,9 @@ class SessionManager:
             
             for token in expired_tokens:
                 del self._sessions[token]
+
+            for user_id in [user_id for user_id, (expires_at, _profile) in self._profiles.items() if expires_at <= now]:
+                del self._profiles[user_id]
                 
             if expired_tokens:
                 _logger.info(f"Cleaned up {len(expired_tokens)} expired sessions")
@@ -98,11 +154,58 @@ class SessionManager:
         except Exception as e:
             _logger.error(f"Error during session cleanup: {str(e)}")
     
+    def get_cached_profile(self, user_id):
+        """Get the cached profile payload of a user, or None"""
+        try:
+            if self._redis is not None:
+                cached = self._redis.get(PROFILE_CACHE_PREFIX + str(user_id))
+                return orjson.loads(cached) if cached else None
+            with self._lock:
+                cached = self._profiles.get(user_id)
+                if cached and cached[0] > datetime.now():
+                    return dict(cached[1])
+                return None
+        except Exception as e:
+            _logger.error("Error getting cached profile: %s", e)
+            return None
+
+    def cache_profile(self, user_id, profile):
+        """Cache a user's profile payload for PROFILE_CACHE_TTL seconds"""
+        try:
+            if self._redis is not None:
+                self._redis.setex(PROFILE_CACHE_PREFIX + str(user_id), PROFILE_CACHE_TTL, orjson.dumps(profile))
+                return
+            with self._lock:
+                self._profiles[user_id] = (datetime.now() + timedelta(seconds=PROFILE_CACHE_TTL), dict(profile))
+        except Exception as e:
+            _logger.error("Error caching profile: %s", e)
+
+    def invalidate_profile(self, user_id):
+        """Drop a user's cached profile payload; call after changing its source rows"""
+        try:
+            if self._redis is not None:
+                self._redis.delete(PROFILE_CACHE_PREFIX + str(user_id))
+                return
+            with self._lock:
+                self._profiles.pop(user_id, None)
+        except Exception as e:
+            _logger.error("Error invalidating cached profile: %s", e)
+
+    def invalidate_profile_on_commit(self, cr, user_id):
+        """Drop a user's cached profile once cr commits its changes
+
+        Dropping it earlier would let a concurrent profile request cache the
+        rows as they were before this transaction.
+        """
+        cr.postcommit.add(functools.partial(self.invalidate_profile, user_id))
+
     def get_session_count(self):
         """Get current session count (for debugging)"""
+        if self._redis is not None:
+            return sum(1 for _ in self._redis.scan_iter(REDIS_SESSION_PREFIX + '*'))
         with self._lock:
             return len(self._sessions)
 
 # Global session manager instance
-session_manager = SessionManager()
+session_manager = SessionManager(REDIS_URL)
 
@@ -1,4 +1,4 @@
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
 
 
 class ResCompany(models.Model):
@@ -15,6 +15,17 @@ class ResCompany(models.Model):
         help='GPS Longitude coordinate for office location'
     )
     
+    @api.model
+    @tools.ormcache()
+    def _hris_default_company_id(self):
+        """ID of the company the REST API attaches new users and employees to
+
+        Kept in the registry cache, which is dropped on registry reload and
+        whenever a company is created, so a recreated database or a first
+        company never leaves a stale or empty id behind.
+        """
+        return self.sudo().search([], limit=1).id
+
     # Default coordinates (example: Jakarta, Indonesia)
     @api.model
     def _get_default_coordinates(self):
@@ -0,0 +1,54 @@
+import logging
+from odoo import http # type: ignore
+from .controllers.base_controller import _cors_headers_for
+
+_logger = logging.getLogger(__name__)
+
+# Routes answered here: only BaseController routes whose OPTIONS handler is
+# BaseController._handle_options, so the early answer carries exactly the
+# headers the route itself would send. Other /api/ controllers (attendance,
+# leave, overtime, resignation, e-learning) declare their own, narrower CORS
+# headers and keep answering their preflights themselves.
+PREFLIGHT_PATHS = ('/api/auth/', '/api/employees')
+
+# Odoo's own dispatcher, even if this module is imported again
+_dispatch = getattr(http.Application.__call__, '__wrapped__', http.Application.__call__)
+
+
+def _is_preflight_path(path):
+    """Whether path belongs to a route answered by _answer_api_preflight"""
+    return any(path == prefix.rstrip('/') or path.startswith(prefix.rstrip('/') + '/') for prefix in PREFLIGHT_PATHS)
+
+
+def _answer_api_preflight(self, environ, start_response):
+    """Answer CORS preflights for the API before Odoo's dispatcher runs
+
+    A preflight carries no credentials and needs no database, so there is no
+    reason to walk the router, load a session or take a cursor for it.
+    """
+    if environ.get('REQUEST_METHOD') == 'OPTIONS' and _is_preflight_path(environ.get('PATH_INFO', '')):
+        headers = list(_cors_headers_for(environ.get('HTTP_ORIGIN', '*')).items())
+        headers.append(('Content-Length', '0'))
+        start_response('200 OK', headers)
+        return [b'']
+    return _dispatch(self, environ, start_response)
+
+
+_answer_api_preflight.__wrapped__ = _dispatch
+
+
+def install_preflight():
+    """Route requests through _answer_api_preflight in this process"""
+    http.Application.__call__ = _answer_api_preflight
+    _logger.info("API CORS preflight short-circuit installed for %s", ', '.join(PREFLIGHT_PATHS))
+
+
+def uninstall_preflight():
+    """Give requests back to Odoo's dispatcher in this process"""
+    http.Application.__call__ = _dispatch
+    _logger.info("API CORS preflight short-circuit removed")
+
+
+# The patch is process-wide: once any database loads the module, this process
+# answers these preflights for every database it serves (see README)
+install_preflight()
@@ -17,9 +17,8 @@ class HrAttendance(models.Model):
             for record in self:
                 if record.check_in and record.check_out:
                     duration = record.check_out - record.check_in
-                    hours = int(duration.total_seconds() // 3600)
-                    minutes = int((duration.total_seconds() % 3600) // 60)
-                    seconds = int(duration.total_seconds() % 60)
+                    minutes, seconds = divmod(int(duration.total_seconds()), 60)
+                    hours, minutes = divmod(minutes, 60)
                     working_hours = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
                     # Use sudo() to avoid permission issues
                     record.sudo().write({'working_hours': working_hours})